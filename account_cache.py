@@ -0,0 +1,181 @@
+import threading
+import time
+
+from api_access import SolarCheck
+from singleflight import credential_hash
+
+# Seconds the account catalog is reused before asking the API again
+CATALOG_TTL = 10 * 60
+
+
+class ChannelRecord:
+    __slots__ = ("connection_id", "metering_point_id", "channel", "unit", "direction", "details")
+
+    def __init__(self, connection_id, metering_point_id: str, details: dict):
+        """
+        One channel of a metering point
+        :param connection_id: Id of the connection the metering point belongs to
+        :param metering_point_id: Id of the metering point
+        :param details: Channel entry of the meters API {"channel", "unit", "direction"}
+        """
+        self.connection_id = connection_id
+        self.metering_point_id = f"{metering_point_id}"
+        self.channel = f"{details['channel']}"
+        self.unit = details.get("unit")
+        self.direction = details.get("direction")
+        self.details = details
+
+
+class ChannelIndex:
+    def __init__(self, account_data: list):
+        """
+        Channel records of every connection with lookups by key, channel, unit and direction
+        :param account_data: Response of the meters API
+        """
+        self.records = dict()
+        self.by_channel = dict()
+        self.by_unit = dict()
+        self.by_direction = dict()
+        for connection in account_data:
+            for point in connection["meteringPoints"]:
+                for details in point["channels"]:
+                    record = ChannelRecord(connection["connectionId"], point["meteringPointId"], details)
+                    self.records[(record.metering_point_id, record.channel)] = record
+                    self.by_channel.setdefault(record.channel, list()).append(record)
+                    self.by_unit.setdefault(record.unit, list()).append(record)
+                    self.by_direction.setdefault(record.direction, list()).append(record)
+
+    def get(self, metering_point_id, channel_id):
+        return self.records.get((f"{metering_point_id}", f"{channel_id}"))
+
+    def select(self, unit: str = None, direction: str = None) -> list:
+        """
+        Channel records matching the unit and the direction
+        :param unit: e.g. "KWH", any when not given
+        :param direction: e.g. "LVR", any when not given
+        :return: list of ChannelRecord
+        """
+        if unit is None and direction is None:
+            return list(self.records.values())
+        if unit is None:
+            return list(self.by_direction.get(direction, list()))
+        return [r for r in self.by_unit.get(unit, list()) if direction is None or r.direction == direction]
+
+
+class AccountCatalog:
+    def __init__(self, account_data: list, connection_index: int = 0, channels: ChannelIndex = None):
+        """
+        Connections, metering points and channels available under the account
+        :param account_data: Response of the meters API
+        :param connection_index: Position of the connection the single connection pages work with
+        :param channels: Channel index of every connection when already built
+        """
+        self.connections = account_data
+        self.connection_ids = [connection["connectionId"] for connection in account_data]
+        self.connection = account_data[connection_index]
+        self.connection_id = self.connection["connectionId"]
+        self.metering_points = self.connection["meteringPoints"]
+        self.point_ids = SolarCheck.process_mettering_points(self.metering_points)
+        # Metering point ids are unique across connections, one index serves the whole fleet
+        self.channels = channels if channels is not None else ChannelIndex(account_data)
+        self.views = {self.connection_id: self}
+
+    def view(self, connection_id):
+        """
+        Catalog working with another connection of the same account
+        :param connection_id: Id of the connection
+        :return: AccountCatalog
+        """
+        if connection_id not in self.views:
+            index = self.connection_ids.index(connection_id)
+            view = AccountCatalog(self.connections, connection_index=index, channels=self.channels)
+            view.views = self.views
+            self.views[connection_id] = view
+        return self.views[connection_id]
+
+    def fleet(self) -> list:
+        """
+        Metering points of every connection
+        :return: [(connection_id, {"meteringPointId", "channels"})], points are copies
+        """
+        return [(connection_id, dict(point)) for connection_id in self.connection_ids
+                for point in self.view(connection_id).point_ids]
+
+    def ids(self) -> list:
+        """
+        IDs and channels of each metering point, copied as processing attaches stats to them
+        :return: list
+        """
+        return [dict(point) for point in self.point_ids]
+
+    def get_channel_details(self, metering_point_id, channel_id) -> dict:
+        """
+        Details of the channel used for data presentation
+        :param metering_point_id: id of the metering point
+        :param channel_id: Id of the channel
+        :return: {"channel": "18160", "unit": "KW", "direction": "LVR"}, None for unknown channels
+        """
+        record = self.channels.get(metering_point_id, channel_id)
+        return record.details if record is not None else None
+
+    def available_channels(self) -> list:
+        """
+        Channel ids present on any metering point of the account
+        :return: sorted list of str
+        """
+        return sorted(self.channels.by_channel)
+
+
+class AccountCache:
+    def __init__(self, ttl: float = CATALOG_TTL):
+        """
+        Account catalogs shared by the sessions, keyed by hashed credentials
+        :param ttl: Seconds the catalog stays valid
+        """
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = dict()
+
+    def get(self, solar: SolarCheck, refresh: bool = False) -> tuple:
+        """
+        Get account catalog for the credentials of the client
+        :param solar: Client with the credentials
+        :param refresh: Ignore the cached catalog and ask the API again
+        :return: (True, AccountCatalog) or (False, error details) same as SolarCheck.get_all_meters
+        """
+        user_key = credential_hash(solar.username)
+        secret_key = credential_hash(solar.username, solar.password)
+        with self.lock:
+            entry = self.entries.get(user_key)
+            if entry and entry["credentials"] == secret_key and not refresh \
+                    and time.monotonic() - entry["fetched_at"] < self.ttl:
+                return True, entry["catalog"]
+
+        account_data = solar.get_all_meters()
+        if not account_data[0]:
+            # A failed login, e.g. with a wrong password, leaves the cached entry of the account in place
+            return account_data
+        catalog = AccountCatalog(account_data[1])
+        with self.lock:
+            self.entries[user_key] = {"credentials": secret_key, "fetched_at": time.monotonic(), "catalog": catalog}
+        return True, catalog
+
+    def invalidate(self, username: str):
+        with self.lock:
+            self.entries.pop(credential_hash(username), None)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_account_cache() -> AccountCache:
+    """
+    Process wide account catalog cache
+    :return: AccountCache
+    """
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = AccountCache()
+        return _default_cache
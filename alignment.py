@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+
+
+def merged_column_names(column_lists: list) -> list:
+    """
+    Column names as produced by chaining pd.merge over the frames, overlapping names get _x/_y suffixes
+    :param column_lists: Columns of every frame in merge order
+    :return: list of names
+    """
+    names = list(column_lists[0])
+    for columns in column_lists[1:]:
+        overlap = set(names) & set(columns)
+        names = [f"{c}_x" if c in overlap else c for c in names] + \
+                [f"{c}_y" if c in overlap else c for c in columns]
+    return names
+
+
+def align_frames(frames: list, how: str = "outer", freq: str = None, agg: str = "mean") -> pd.DataFrame:
+    """
+    Build one wide frame of all the channels in a single pass over their shared time index. Local times
+    repeated when the clock is turned back are matched by occurrence, so no sample is overwritten.
+    :param frames: Dataframes indexed by time, one or more value columns each
+    :param how: "outer" keeps every timestamp, "inner" only the ones present in all frames
+    :param freq: Optional pandas offset (e.g. "15min", "1H") every frame is resampled to first
+    :param agg: Resample aggregation, "mean" or "sum"
+    :return: Wide dataframe, empty frame when there is nothing to align
+    """
+    with stage("merge"):
+        return _align(frames, how, freq, agg)
+
+
+def _align(frames: list, how: str, freq: str, agg: str) -> pd.DataFrame:
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        return pd.DataFrame(index=pd.DatetimeIndex(list(), name="snapshot"))
+    if how not in ("outer", "inner"):
+        raise ValueError(f"Unsupported alignment {how}")
+    if freq:
+        frames = [getattr(frame.resample(freq), agg)() for frame in frames]
+
+    keys = [frame.index.values.astype("datetime64[ns]").view(np.int64) for frame in frames]
+    repeats = [occurrences(key) for key in keys]
+    if any(repeat.any() for repeat in repeats):
+        index, positions = _repeated_positions(keys, repeats, how)
+    else:
+        if how == "outer":
+            index = np.unique(np.concatenate(keys))
+        else:
+            unique, counts = np.unique(np.concatenate([np.unique(k) for k in keys]), return_counts=True)
+            index = unique[counts == len(keys)]
+        positions = [np.searchsorted(index, key) for key in keys]
+        if how == "inner":
+            for number, (key, position) in enumerate(zip(keys, positions)):
+                found = position < len(index)
+                found[found] = index[position[found]] == key[found]
+                positions[number] = np.where(found, position, -1)
+
+    widths = [frame.shape[1] for frame in frames]
+    matrix = np.full((len(index), sum(widths)), np.nan)
+    column = 0
+    for frame, position, width in zip(frames, positions, widths):
+        values = frame.to_numpy(dtype=np.float64, na_value=np.nan)
+        found = position >= 0
+        matrix[position[found], column:column + width] = values[found]
+        column += width
+
+    return pd.DataFrame(matrix, columns=merged_column_names([list(frame.columns) for frame in frames]),
+                        index=pd.DatetimeIndex(index.view("datetime64[ns]"), name=frames[0].index.name))
+
+
+def occurrences(key: np.ndarray) -> np.ndarray:
+    """
+    How many times each timestamp already appeared earlier in the frame. Naive local times repeat in the hour
+    when the clock is turned back, the first occurrence is the earlier one.
+    :param key: int64 timestamps in frame order
+    :return: int64 array, all zeros when the timestamps are unique
+    """
+    if len(key) < 2 or (key[1:] > key[:-1]).all():
+        return np.zeros(len(key), dtype=np.int64)
+    order = np.argsort(key, kind="stable")
+    ordered = key[order]
+    starts = np.flatnonzero(np.r_[True, ordered[1:] != ordered[:-1]])
+    rank = np.arange(len(key)) - np.repeat(starts, np.diff(np.r_[starts, len(key)]))
+    repeat = np.empty(len(key), dtype=np.int64)
+    repeat[order] = rank
+    return repeat
+
+
+def _repeated_positions(keys: list, repeats: list, how: str) -> tuple:
+    """
+    Align on (timestamp, occurrence) so repeated wall clock times of every frame meet their counterpart
+    :return: (index, [row position of every sample, -1 when left out])
+    """
+    pairs = np.concatenate([np.stack([key, repeat], axis=1) for key, repeat in zip(keys, repeats)])
+    unique, inverse, counts = np.unique(pairs, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    kept = counts == len(keys) if how == "inner" else np.ones(len(unique), dtype=bool)
+    # Chronological order: the second pass of a repeated hour and everything after it are one hour later
+    hour = 3600 * 10 ** 9
+    repeated = np.unique(unique[unique[:, 1] > 0, 0])
+    ends = repeated[np.r_[np.diff(repeated) > hour, True]] if len(repeated) else repeated
+    shifted = unique[:, 0] + hour * (np.searchsorted(ends, unique[:, 0]) + unique[:, 1])
+    order = np.argsort(shifted, kind="stable")
+    order = order[kept[order]]
+    row = np.full(len(unique), -1)
+    row[order] = np.arange(len(order))
+    positions = np.split(row[inverse], np.cumsum([len(key) for key in keys])[:-1])
+    return unique[order, 0], positions
@@ -1,20 +1,67 @@
-import requests
+import os
 from requests.auth import HTTPBasicAuth
 import pandas as pd
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from transport import Transport, get_transport
+from measurement_store import MeasurementStore, daily_period, monthly_period, period_end, samples_for_day, \
+    merge_samples
+from series import ORIGINS, STATUSES, TIMEZONE, MeasurementSeries, decode_measurements, local_date
+from instrumentation import stage
+from fetcher import fetch_all
+from singleflight import SingleFlight, credential_hash, get_single_flight
+
+# Root of the meetdata API, can point to a local stand-in server for benchmarks
+API_URL = os.environ.get("PANNEL_API_URL", "https://webapi.meetdata.nl/api/1/")
+# Days a stored month may miss before the whole month is fetched again in one request instead
+REFRESH_MAX_DAYS = 2
 
 
 class SolarCheck:
-    def __init__(self, username, password):
+    def __init__(self, username, password, transport: Transport = None, store: MeasurementStore = None,
+                 api_url: str = API_URL, single_flight: SingleFlight = None, channels: list = None):
         self.username = username
         self.password = password
-        self.meters = "https://webapi.meetdata.nl/api/1/meters"
-        self.measurements = "https://webapi.meetdata.nl/api/1/measurements/"
+        self.main = api_url.rstrip("/") + "/"
+        self.meters = self.main + "meters"
+        self.measurements = self.main + "measurements/"
         self.authorization = HTTPBasicAuth(self.username, self.password)
-        self.main = "https://webapi.meetdata.nl/api/1/"
+        self.transport = transport or get_transport()
+        self.store = store
+        self.single_flight = single_flight or get_single_flight()
+        # Coalesced calls are only shared between clients of the same account and API
+        self.scope = credential_hash(self.main, self.username, self.password)
+        # Channels decoded from the responses, None keeps all of them
+        self.channels = channels
+
+    @property
+    def channels(self):
+        return self._channels
+
+    @channels.setter
+    def channels(self, channels):
+        self._channels = tuple(sorted(f"{c}" for c in channels)) if channels else None
+
+    def select_channels(self, data: dict):
+        """
+        Restrict stored data to the selected channels
+        :param data: {channel: MeasurementSeries}
+        :return: Selected part of the data, None when one of the selected channels was never stored
+        """
+        if self._channels is None:
+            return data
+        if any(channel not in data for channel in self._channels):
+            return None
+        return {k: v for k, v in data.items() if k in self._channels or not isinstance(v, MeasurementSeries)}
+
+    def api_stats(self) -> dict:
+        """
+        Latency and error counters per API route of the shared transport
+        :return: dict
+        """
+        return self.transport.stats.snapshot()
 
     def check_credentials(self):
-        r = requests.post(self.meters, auth=self.authorization)
+        r = self.transport.post(self.meters, route="meters", auth=self.authorization)
         return r.status_code == 200
 
     def get_all_meters(self):
@@ -22,28 +69,111 @@ class SolarCheck:
         If connection is ok than let the data trhough
         :return:
         """
-        r = requests.post(self.meters, auth=self.authorization)
+        r = self.transport.post(self.meters, route="meters", auth=self.authorization)
         if r.status_code == 200:
             return True, r.json()
         else:
             return False, r.json()
 
     def get_daily(self, connection_id: int, metering_point: int, year: int, month: int, day: int):
+        """
+        Get daily values for metering point, served from the measurement store when available
+        """
+        if self.store is None:
+            return self.fetch_daily(connection_id, metering_point, year, month, day)
+        period = daily_period(year, month, day)
+        cached = self.store.lookup(connection_id, metering_point, period, count=False)
+        if cached and self.select_channels(cached[0]) is not None:
+            self.store.record(hit=True)
+            return self.select_channels(cached[0])
+        # Completed day inside an already stored month does not need a call
+        requested = date(year, month, day)
+        in_month = self.store.lookup(connection_id, metering_point, monthly_period(year, month), count=False)
+        if in_month and in_month[1] and (in_month[2] or local_date(in_month[1]) > requested) \
+                and self.select_channels(in_month[0]) is not None:
+            self.store.record(hit=True)
+            return samples_for_day(self.select_channels(in_month[0]), requested)
+        self.store.record(hit=False)
+        data = self.fetch_daily(connection_id, metering_point, year, month, day)
+        if isinstance(data, dict):
+            self.store.save(connection_id, metering_point, period, data)
+        return data
+
+    def get_monthly(self, connection_id, metering_point: int, year: int, month: int):
+        """
+        Get monthly values for metering point, served from the measurement store when available.
+        Expired current month is refreshed only with the days newer than the last stored sample.
+        """
+        if self.store is None:
+            return self.fetch_monthly(connection_id, metering_point, year, month)
+        period = monthly_period(year, month)
+        cached = self.store.lookup(connection_id, metering_point, period, count=False)
+        if cached and self.select_channels(cached[0]) is not None:
+            self.store.record(hit=True)
+            return self.select_channels(cached[0])
+        self.store.record(hit=False)
+        data = None
+        stale = self.store.lookup(connection_id, metering_point, period, fresh_only=False, count=False)
+        if stale and stale[1] and self.select_channels(stale[0]) is not None:
+            data = self.refresh_month(connection_id, metering_point, self.select_channels(stale[0]), stale[1])
+        if data is None:
+            data = self.fetch_monthly(connection_id, metering_point, year, month)
+        if isinstance(data, dict):
+            self.store.save(connection_id, metering_point, period, data)
+        return data
+
+    def refresh_month(self, connection_id, metering_point: int, stored: dict, last_ts: int):
+        """
+        Fetch only the days since the last stored sample in parallel and merge them with the stored month
+        :return: Merged data, None if more than REFRESH_MAX_DAYS days are missing or any of the days failed,
+                 the whole month is fetched then
+        """
+        last_day = local_date(last_ts)
+        end_of_month = period_end(monthly_period(last_day.year, last_day.month))
+        last_available = min(date.today() - timedelta(days=1), end_of_month)
+        days = [last_day + timedelta(days=offset) for offset in range((last_available - last_day).days + 1)]
+        if len(days) > REFRESH_MAX_DAYS:
+            return None
+        fresh = dict()
+        for data in fetch_all([(self.fetch_daily, (connection_id, metering_point, day.year, day.month, day.day))
+                               for day in days]):
+            if not isinstance(data, dict):
+                return None
+            fresh = merge_samples(fresh, data)
+        return merge_samples(stored, fresh)
+
+    def fetch_daily(self, connection_id: int, metering_point: int, year: int, month: int, day: int):
         """
         Get daily values for metering point
         """
         api = self.measurements + f"{connection_id}/" + f"{metering_point}/" + f"{year}/" + f"{month}/" + f"{day}"
-        r = requests.post(api, auth=self.authorization)
-        if r.status_code == 200:
-            return r.json()
-        else:
-            return "api error"
+        return self.fetch_measurements(api, route="measurements/daily")
 
-    def get_monthly(self, connection_id, metering_point: int, year: int, month: int):
+    def fetch_monthly(self, connection_id, metering_point: int, year: int, month: int):
         api = self.measurements + f"{connection_id}/" + f"{metering_point}/" + f"{year}/" + f"{month}"
-        r = requests.post(api, auth=self.authorization)
+        return self.fetch_measurements(api, route="measurements/monthly")
+
+    def fetch_measurements(self, api: str, route: str):
+        """
+        POST to the measurements endpoint, identical requests in flight from other sessions share one call
+        :param api: Full url of the request
+        :param route: Label of the route for the counters
+        :return: {channel: MeasurementSeries} or "api error"
+        """
+        data = self.single_flight.do((self.scope, api, self._channels), self.request_measurements, api, route,
+                                     self._channels)
+        # Every caller gets its own dictionary, the series themselves are shared read only
+        return dict(data) if isinstance(data, dict) else data
+
+    def request_measurements(self, api: str, route: str, channels: tuple = None):
+        r = self.transport.post(api, route=route, auth=self.authorization)
         if r.status_code == 200:
-            return r.json()
+            with stage("json_decode"):
+                data = decode_measurements(r.json(), channels)
+            # Selected channels the meter does not report are stored empty, so the store knows they were asked
+            for channel in channels or ():
+                data.setdefault(channel, MeasurementSeries.empty())
+            return data
         else:
             return "api error"
 
@@ -52,12 +182,14 @@ class SolarCheck:
         """
         Process response from metering data
         """
-        human = str()
-        for d in data:
-            actual_date = datetime.fromtimestamp(d["timestamp"])
-            constr = f"{actual_date} origin: {d['origin']} status:{d['status']} Value:{d['value']}\n"
-            human += constr
-        return human
+        if isinstance(data, MeasurementSeries):
+            samples = zip(data.timestamps.tolist(), ORIGINS.decode(data.origin), STATUSES.decode(data.status),
+                          data.values.tolist())
+        else:
+            samples = ((d["timestamp"], d["origin"], d["status"], d["value"]) for d in data)
+        # Lines are joined once, the string is not rebuilt for every sample
+        return "".join([f"{datetime.fromtimestamp(timestamp)} origin: {origin} status:{status} Value:{value}\n"
+                        for timestamp, origin, status, value in samples])
 
     @staticmethod
     def process_mettering_points(metering_points: list):
@@ -81,32 +213,37 @@ class SolarCheck:
     def make_data_frame(data: list, column_name: str) -> pd.DataFrame:
         """
         Creates dataframe for the list of dictionaries
-        :param data: list of dictionaries
+        :param data: MeasurementSeries or list of dictionaries, left untouched
         :param column_name: Name of the column you would like to assign
         :return:
         """
-        # convert from unix to human readable
-        for stat in data:
-            actual_date = datetime.fromtimestamp(stat["timestamp"])
-            stat["snapshot"] = actual_date
-        df = pd.DataFrame.from_dict(data)
-        df.drop(['origin', 'status', 'timestamp'], axis=1, inplace=True)
-        df.set_index("snapshot", inplace=True)
-        df.rename({'value': column_name}, axis='columns', inplace=True)
-        return df
+        return samples_to_frame(data, column_name)
 
     @staticmethod
     def filter_data_frame(data: list, column_name: str, start_date, end_date):
-        for stat in data:
-            stat["snapshot"] = datetime.fromtimestamp(stat["timestamp"])
-            stat.pop("origin")
-            stat.pop("status")
-        df = pd.DataFrame.from_dict(data)
-        df.loc[:, 'timestamp'] = df.timestamp.apply(lambda x: datetime.fromtimestamp(x).date())
-        mask = (df['timestamp'] > start_date) & (
-                df['timestamp'] <= end_date)
-        filtered_df = df.loc[mask]
-        filtered_df.drop(['timestamp'], axis=1, inplace=True)
-        filtered_df.set_index("snapshot", inplace=True)
-        filtered_df.rename({'value': column_name}, axis='columns', inplace=True)
-        return filtered_df
+        """
+        Creates dataframe only with the samples from days after start_date up to and including end_date
+        :param data: MeasurementSeries or list of dictionaries, left untouched
+        :param column_name: Name of the column you would like to assign
+        :param start_date: Exclusive lower bound date
+        :param end_date: Inclusive upper bound date
+        :return:
+        """
+        df = samples_to_frame(data, column_name)
+        days = df.index.normalize()
+        mask = (days > pd.Timestamp(start_date)) & (days <= pd.Timestamp(end_date))
+        return df.loc[mask]
+
+
+def samples_to_frame(data, column_name: str, tz: str = TIMEZONE) -> pd.DataFrame:
+    """
+    Build the dataframe straight from the samples with one vectorized timestamp conversion
+    :param data: MeasurementSeries or list of {"timestamp", "value", "origin", "status"} dictionaries
+    :param column_name: Name of the value column
+    :param tz: Timezone the unix timestamps are shown in
+    :return: Dataframe indexed by naive local "snapshot" times
+    """
+    with stage("make_data_frame"):
+        if not isinstance(data, MeasurementSeries):
+            data = MeasurementSeries.from_records(data)
+        return data.to_frame(column_name, tz)
@@ -1,14 +1,15 @@
 import streamlit as st
-from api_access import SolarCheck
+from instrumentation import METRICS_ENABLED, enable_metrics, set_trace, stage, start_trace
 from datetime import datetime
 from datetime import timedelta
-import pandas as pd
-import base64
+import os
 import calendar
-from io import BytesIO
-from functools import reduce
 from datetime import date
 
+# The API client, the store and the export engines are imported by the pages needing them, so the welcome page
+# renders before requests, sqlite and the writers are loaded. Set to 0 to keep the balloons of the welcome page.
+FAST_START = os.environ.get("PANNEL_FAST_START", "1") == "1"
+
 st.set_page_config(page_title='Dashboard', page_icon="🔌", layout='wide', initial_sidebar_state='expanded')
 
 
@@ -34,7 +35,8 @@ def welcome_string():
     Loads on start with explanation
     :return:
     """
-    st.balloons()
+    if not FAST_START:
+        st.balloons()
     st.title("Welcome to the Solar Panel Explorer")
     st.subheader("How to start?")
     st.info("Go to sidebar on the left side and choose from drop down menu LOGIN. Provide credential details and if "
@@ -56,198 +58,341 @@ def successfull_login_info():
             " ***Daily*** timeframe has as well two further options which allow you to obtain either data for specific "
             " day or for day range inside the current month.\n"
             " Furthermore statistical data per either channel or merged with all showcased channels is available to be "
-            "downloaded in __csv__ or __excel__ format.")
+            "downloaded in __csv__, __excel__ or __parquet__ format.")
+    st.markdown("\n## :globe_with_meridians: Fleet\n")
+    st.info("Totals per channel and direction over every connection and metering point of the account, together "
+            "with the totals per connection and per metering point.")
     st.markdown("\n## :house: Home\n")
     st.info("Return to this page.\n")
 
 
 def download_link(file_to_download, file_name: str, button_text: str, file_type: str):
     """
-    Create a link to download specific dataframe
-    :param file_to_download:
-    :param file_name:
-    :param button_text:
-    :return:
+    Create a link to download specific dataframe, the file is written in chunks and served by the export server
+    :param file_to_download: pd.DataFrame
+    :param file_name: Name of the downloaded file
+    :param button_text: Text of the link
+    :param file_type: "csv", "xls" or "parquet"
+    :return: html link
     """
+    import pandas as pd
+    from exports import get_export_server
 
     if isinstance(file_to_download, pd.DataFrame):
-        if file_type == 'csv':
-            file_to_download = file_to_download.to_csv(index=True)
-            b64 = base64.b64encode(file_to_download.encode()).decode()
-            return f'<a href="data:file/txt;base64,{b64}" download="{file_name}">{button_text}</a>'
-        elif file_type == 'xls':
-            val = dataframe_to_excel(file_to_download)
-            b64 = base64.b64encode(val)  # val looks like b'...'
-            return f'<a href="data:application/octet-stream;base64,{b64.decode()}" download="Your_File.xlsx">Download Excel file</a>'  # decode b'abc' => abc
-
-
-def dataframe_to_excel(data_frame, sheet_name: str = None):
-    """
-    Stores the dataframe to excel for export
-    :param data_frame: pd.DataFrame
-    :param sheet_name: Name of the sheet in excel file
-    :return:
-    """
-
-    output = BytesIO()
-    writer = pd.ExcelWriter(output, engine='xlsxwriter')
-    data_frame.to_excel(writer, index=True, sheet_name=f'{sheet_name}')
-    workbook = writer.book
-    worksheet = writer.sheets[f'{sheet_name}']
-    format1 = workbook.add_format({'num_format': '0.00'})  # Tried with '0%' and '#,##0.00' also.
-    worksheet.set_column('A:A', None, format1)  # Say Data are in column A
-    writer.save()
-    processed_data = output.getvalue()
-    return processed_data
+        try:
+            server = get_export_server()
+        except OSError as error:
+            st.error(f"Download is not available: {error.strerror}")
+            return ""
+        url = server.export(file_to_download, file_name=file_name, file_type=file_type)
+        return f'<a href="{url}" download="{os.path.basename(url)}">{button_text}</a>'
 
 
-def produce_total_windows(dataframe: pd.DataFrame, total: str = None):
+def produce_total_windows(dataframe, total: str = None, point_budget: int = None, units: list = None,
+                          export=None):
     """
     Produce the UX for all data on one chart
     :param dataframe: Pandas Dataframe
+    :param total: Totals computed on the full resolution data
+    :param point_budget: Points sent to the browser per chart and table, CHART_POINT_BUDGET by default
+    :param units: Unit of every column in order, the table sums energy and averages power columns
+    :param export: Function building the frame the download buttons export, called on click only,
+                   the shown dataframe is exported when not given
     :return: None
     """
+    from downsample import decimate, table_method, CHART_POINT_BUDGET
+
+    point_budget = point_budget or CHART_POINT_BUDGET
+    method = [table_method(unit) for unit in units] if units else "sum"
     pos1, pos2, pos3 = st.beta_columns([3, 1, 0.3])
-    pos1.line_chart(dataframe)
-    pos2.text(total)
-    pos2.dataframe(dataframe)
+    with stage("render"):
+        pos1.line_chart(decimate(dataframe, budget=point_budget, method="lttb"))
+        pos2.text(total)
+        pos2.dataframe(decimate(dataframe, budget=point_budget, method=method))
+    export = export or (lambda: dataframe)
     if pos3.button(f"Get CSV"):
-        tmp_download_link = download_link(dataframe, f'YOUR_DF.csv', 'Click here to download your data!',
+        tmp_download_link = download_link(export(), f'YOUR_DF.csv', 'Click here to download your data!',
                                           file_type='csv', )
         pos3.markdown(tmp_download_link, unsafe_allow_html=True)
     elif pos3.button(f"Get XLS"):
-        tmp_download_link = download_link(dataframe, 'YOUR_DF.csv', 'Click here to download your data!',
+        tmp_download_link = download_link(export(), 'YOUR_DF.xlsx', 'Click here to download your data!',
                                           file_type='xls')
         pos3.markdown(tmp_download_link, unsafe_allow_html=True)
+    elif pos3.button(f"Get Parquet"):
+        tmp_download_link = download_link(export(), 'YOUR_DF.parquet', 'Click here to download your data!',
+                                          file_type='parquet')
+        pos3.markdown(tmp_download_link, unsafe_allow_html=True)
 
 
-def produce_data_window(dataframe, id: str, meter_unit: str):
+def produce_data_window(dataframe, id: str, meter_unit: str, point_budget: int = None, rollup=None):
     """
     Produce UX
     :param dataframe: Pandas dataframe
     :param id: Id of the meter
     :param meter_unit: Unit used for channel
+    :param point_budget: Points sent to the browser per chart and table, CHART_POINT_BUDGET by default
+    :param rollup: Rollup of the channel, the total and the table are read from it when given
     :return: None
     """
+    from downsample import decimate, table_method, CHART_POINT_BUDGET
+
+    point_budget = point_budget or CHART_POINT_BUDGET
+    method = table_method(meter_unit)  # power is averaged, only energy adds up
     pos1, pos2, pos3 = st.beta_columns([4, 1, 0.5])
-    pos1.line_chart(dataframe)
-    meter_total = f'∑ {id}: {dataframe[f"{id}"].sum()} {meter_unit}'
-    pos2.markdown(meter_total)
-    pos2.write(dataframe)
+    with stage("render"):
+        pos1.line_chart(decimate(dataframe, budget=point_budget, method="lttb"))
+        if rollup is not None:
+            meter_total = f'∑ {id}: {rollup.total()} {meter_unit}'
+            pos2.markdown(meter_total)
+            table = rollup.to_frame()
+            pos2.write(table.drop(columns="sum") if method == "mean" else table.drop(columns="mean"))
+        else:
+            # Total always comes from the full resolution data
+            meter_total = f'∑ {id}: {dataframe[f"{id}"].sum()} {meter_unit}'
+            pos2.markdown(meter_total)
+            pos2.write(decimate(dataframe, budget=point_budget, method=method))
     if pos3.button(f"Get {id} CSV"):
         tmp_download_link = download_link(dataframe, f'{id}.csv', 'Click here to download your data!',
                                           file_type='csv', )
         st.markdown(tmp_download_link, unsafe_allow_html=True)
     elif pos3.button(f"Get {id} XlS"):
-        tmp_download_link = download_link(dataframe, f'{id}.csv', 'Click here to download your data!',
+        tmp_download_link = download_link(dataframe, f'{id}.xlsx', 'Click here to download your data!',
                                           file_type='xls')
         st.markdown(tmp_download_link, unsafe_allow_html=True)
+    elif pos3.button(f"Get {id} Parquet"):
+        tmp_download_link = download_link(dataframe, f'{id}.parquet', 'Click here to download your data!',
+                                          file_type='parquet')
+        st.markdown(tmp_download_link, unsafe_allow_html=True)
     return meter_total
 
 
-def process_points(ids: list, solar, connection_id, month=None, year=None, selected_date=None,
-                   monthly: bool = False) -> list:
-    """
-    Filters all the points available
-    :param ids: Point Ids
-    :param solar: Solar Class to access class functions
-    :param connection_id: Id as int
-    :param month: month
-    :param year: year
-    :param selected_date: selection box
-    :param monthly: Boolean if monthly stats are for processing
-    :return: List of processed data
+def presented_channels(point: dict, catalog) -> list:
     """
-    new_structure = list()
-    for id in ids:
-        if not monthly:
-            id_values = solar.get_daily(connection_id, id["meteringPointId"], selected_date.year, selected_date.month,
-                                        selected_date.day)
-        else:
-            id_values = solar.get_monthly(connection_id, id["meteringPointId"], year, month)
-        if isinstance(id_values, dict):
-            id['stats'] = id_values
-            new_structure.append(id)
-    return new_structure
-
-
-def process_points_for_date_range(ids: list, solar, connection_id, date_range: list):
-    new_structure = list()
-    for id in ids:
-        stats_to_process = list()
-        for d in date_range:
-            id_values = solar.get_daily(connection_id, id["meteringPointId"], d.year, d.month, d.day)
-            if isinstance(id_values, dict):
-                stats_to_process.append(id_values)
-        id['stats'] = build_stats(list_of_stats=stats_to_process)
-        new_structure.append(id)
-    return new_structure
-
-
-def make_new_dictionary(old_one: dict):
+    Channels of the metering point shown on the statistics pages
+    :param point: Processed metering point with stats
+    :param catalog: AccountCatalog
+    :return: [(channel, channel details)]
     """
-    Creates new dictionary from the old one as some key poping is needed
-    :param old_one:
-    :return:
-    """
-    new_structure = dict()
-    for k in old_one.keys():
-        try:
-            if isinstance(int(k), int):
-                pass
-        except ValueError:
-            new_structure[k] = old_one[k]
-    return new_structure
-
-
-def build_stats(list_of_stats: list):
-    powers = {key: value for d in list_of_stats for key, value in d.items()}
-    st.json(powers)
-    return
+    presented = list()
+    for chn in point['stats']:
+        channel_details = catalog.get_channel_details(metering_point_id=point['meteringPointId'], channel_id=chn)
+        if channel_details is not None:  # selected channel this meter does not have
+            presented.append((chn, channel_details))
+    return presented
 
 
-def get_channel_details(metering_points: list, metering_point_id: str, channel_id: str):
+def show_point(point: dict, catalog, solar, connection_id, level: str):
     """
-    Get  just the details of the channel which is used for data presentation
-    :param metering_points: List of all metering points
-    :param metering_point_id: id of the metering point used in a call
-    :param channel_id: Id of the channel to be queried for the history
-    :return: channel details in form of:
-    {
-    "channel":"18160"
-    "unit":"KW"
-    "direction":"LVR"
-    }
+    Frame and render every presented channel of one metering point
+    :param point: Processed metering point with stats
+    :param catalog: AccountCatalog
+    :param solar: SolarCheck
+    :param connection_id: Id of the connection
+    :param level: Rollup level of the channel tables, "hour" or "day"
+    :return: (list of dataframes, totals text, list of units)
     """
-    for point in metering_points:
-        if point["meteringPointId"] == metering_point_id:
-            for channel in point["channels"]:
-                if channel["channel"] == channel_id:
-                    return channel
+    from rollups import channel_rollup
+
+    frames, totals, units = list(), str(), list()
+    for chn_stats_cat, channel_details in presented_channels(point, catalog):
+        st.info(f"*** :sparkles: Metering point ID {point['meteringPointId']}***\n"
+                f"\n > __Channel__: {channel_details['channel']}   | "
+                f"__Direction__: {channel_details['direction']}  | "
+                f"__Unit__: {channel_details['unit']}")
+        dataframe = solar.make_data_frame(data=point['stats'][chn_stats_cat], column_name=chn_stats_cat)
+        rollup = channel_rollup(point['stats'][chn_stats_cat], level, solar.store, connection_id,
+                                point['meteringPointId'], chn_stats_cat)
+        total_returned = produce_data_window(dataframe=dataframe, id=chn_stats_cat,
+                                             meter_unit=channel_details['unit'], rollup=rollup)
+        frames.append(dataframe)  # Append to list for futher analywsis
+        totals += f'{total_returned}\n'
+        units.append(channel_details['unit'])
+    return frames, totals, units
+
+
+def show_quality(points: list, catalog, channels: list = None, start=None, end=None):
+    """
+    Gaps, statuses, origins and outliers per metering point and channel
+    :param points: Metering points with stats
+    :param catalog: AccountCatalog, only channels the meters have are analysed
+    :param channels: Channels to include
+    :param start: First shown day, samples missing before the first one count as a gap
+    :param end: Last shown day, inclusive, capped at yesterday
+    :return: None
+    """
+    from quality import quality_frame
+    from series import day_bounds
+
+    start_ts = day_bounds(start)[0] if start is not None else None
+    end_ts = day_bounds(min(end, date.today() - timedelta(days=1)))[1] if end is not None else None
+    with st.beta_expander("Data quality"):
+        quality = quality_frame(points, channels, start_ts, end_ts, catalog=catalog)
+        if len(quality):
+            st.dataframe(quality)
+        else:
+            st.info("No samples to analyse")
 
 
-def process_stats(data: list) -> list:
+def show_statistics(final_data: list, catalog, solar, connection_id, level: str, details_title: str,
+                    summary_title: str, lazy: bool = True, start=None, end=None):
+    """
+    Summary and per metering point details of the fetched statistics
+    :param final_data: Processed metering points with stats
+    :param catalog: AccountCatalog
+    :param solar: SolarCheck
+    :param connection_id: Id of the connection
+    :param level: Rollup level of the tables and of the lazy summary, "hour" or "day"
+    :param details_title: Title of the details expander
+    :param summary_title: Title of the summary
+    :param lazy: Build the summary from the rollups and frame only the selected metering point. Every metering
+                 point is still fetched for the summary totals, framing and rendering grow with the opened ones.
+    :param start: First day of the statistics, for the data quality gaps
+    :param end: Last day of the statistics, inclusive
+    :return: None
     """
-    Process stats to filter out just the ones needed and construct new structure for processing
-    :param data: list of all the stats from API
-    :return: Restructured stats
+    from alignment import align_frames
+    from downsample import table_method
+    from rollups import channel_rollup
+
+    points = [point for point in final_data if point]
+    if not lazy:
+        merged_dataframes, string_build, units = list(), str(), list()
+        with st.beta_expander(details_title):
+            for point in points:
+                frames, totals, point_units = show_point(point, catalog, solar, connection_id, level)
+                merged_dataframes += frames
+                string_build += totals
+                units += point_units
+        st.success(summary_title)
+        all_together = align_frames(merged_dataframes)
+        produce_total_windows(dataframe=all_together, total=string_build, units=units)
+        show_quality(points, catalog, solar.channels, start, end)
+        return
+
+    # Summary first, from the aggregates only, the raw samples are framed for the opened meter and the downloads
+    summary_frames, string_build, units, presented = list(), str(), list(), list()
+    for point in points:
+        for chn_stats_cat, channel_details in presented_channels(point, catalog):
+            rollup = channel_rollup(point['stats'][chn_stats_cat], level, solar.store, connection_id,
+                                    point['meteringPointId'], chn_stats_cat)
+            frame = rollup.to_frame()[[table_method(channel_details["unit"])]]
+            frame.columns = [chn_stats_cat]
+            summary_frames.append(frame)
+            units.append(channel_details["unit"])
+            presented.append((point, chn_stats_cat))
+            string_build += f'∑ {chn_stats_cat}: {rollup.total()} {channel_details["unit"]}\n'
+    st.success(summary_title)
+    st.markdown(f"_Chart and table per {level}: energy summed, power averaged. Downloads hold every sample._")
+
+    def full_resolution():
+        return align_frames([solar.make_data_frame(data=point['stats'][channel], column_name=channel)
+                             for point, channel in presented])
+
+    produce_total_windows(dataframe=align_frames(summary_frames), total=string_build, units=units,
+                          export=full_resolution)
+    show_quality(points, catalog, solar.channels, start, end)
+
+    with st.beta_expander(details_title, expanded=True):
+        options = [point['meteringPointId'] for point in points]
+        selected = st.selectbox("Metering point", ["-"] + options)
+        if selected in options:
+            show_point(points[options.index(selected)], catalog, solar, connection_id, level)
+
+
+def show_fleet(solar, catalog):
+    """
+    Portfolio summary over every connection of the account
+    :param solar: SolarCheck
+    :param catalog: AccountCatalog
+    :return: None
+    """
+    from fleet import fetch_fleet, fleet_summary
+
+    past_day = date.today() + timedelta(days=-1)
+    start_date = st.sidebar.date_input("From", past_day)
+    end_date = st.sidebar.date_input("To", past_day)
+    if not start_date <= end_date < date.today():
+        st.error('Wrong date range specified. Range queries are allowed up to TODAY-1 as system'
+                 ' does not provide current day data.')
+        return
+    st.warning(f':calendar: Fleet of {len(catalog.connection_ids)} connections from {start_date} to {end_date}')
+    points = fetch_fleet(solar, catalog, start_date, end_date)
+    level = "hour" if start_date == end_date else "day"
+    meter_totals, group_totals, fleet_series = fleet_summary(points, catalog, level, solar.store, channels=solar.channels)
+
+    st.success(f"*** :sparkles: Fleet Summary ***")
+    pos1, pos2 = st.beta_columns([3, 1])
+    with stage("render"):
+        pos1.line_chart(fleet_series)
+        pos2.dataframe(group_totals)
+        st.subheader("Per connection")
+        st.dataframe(meter_totals.pivot_table(index="connection", columns="group", values="total", aggfunc="sum"))
+    failed = len(catalog.fleet()) - len(points)
+    if failed:
+        st.error(f"{failed} metering points could not be retrieved")
+    show_quality(points, catalog, solar.channels, start_date, end_date)
+    with st.beta_expander("Totals per metering point"):
+        st.dataframe(meter_totals)
+        if st.button("Get fleet CSV"):
+            st.markdown(download_link(meter_totals, 'fleet.csv', 'Click here to download your data!',
+                                      file_type='csv'), unsafe_allow_html=True)
+
+
+def show_years(solar, ids: list, connection_id, years: list, metering_point_id=None):
+    """
+    Year over year comparison of the monthly and daily totals per channel
+    :param solar: SolarCheck
+    :param ids: Metering points of the connection
+    :param connection_id: Id of the connection
+    :param years: Years to compare
+    :param metering_point_id: Only this metering point, all of them summed when not given
+    :return: None
     """
-    new_structure = list()
-    # Process every meter
-    for meter in data:
-        new_meter = dict()
-        # Process meter point
-        stats = meter["stats"]
-        # take out just the ones needed in list from 1020, 16080
-        for k in stats.keys():
-            new_stats = dict()
-            if int(k) in [10280, 16080]:
-                new_stats[f'{k}'] = stats[f'{k}']
-
-        new_meter = {key: value for d in (new_stats, meter) for key, value in d.items()}
-        updated_meter = make_new_dictionary(old_one=new_meter)
-        new_structure.append(updated_meter)
-    return new_structure
+    from yearly import fetch_years, year_overlay
+
+    st.warning(f':calendar: Statistical data for {", ".join(str(y) for y in years)}')
+    fetched = fetch_years(ids, solar, connection_id, years)
+    monthly = year_overlay(fetched, connection_id, "month", solar.store, solar.channels, metering_point_id)
+    daily = year_overlay(fetched, connection_id, "day", solar.store, solar.channels, metering_point_id)
+
+    st.success(f"*** :sparkles: Monthly totals ***")
+    pos1, pos2 = st.beta_columns([3, 1])
+    with stage("render"):
+        pos1.bar_chart(monthly)
+        pos2.dataframe(monthly.sum().rename("total").to_frame())
+        st.success(f"*** :sparkles: Daily totals by day of the year ***")
+        st.line_chart(daily)
+    with st.beta_expander("Monthly totals table"):
+        st.dataframe(monthly)
+        if st.button("Get yearly CSV"):
+            st.markdown(download_link(monthly, 'yearly.csv', 'Click here to download your data!', file_type='csv'),
+                        unsafe_allow_html=True)
+
+
+def debug_panel(trace):
+    """
+    Timings of this page run together with the API and cache counters
+    :param trace: Trace collected while the page was produced
+    :return: None
+    """
+    import pandas as pd
+    from measurement_store import get_store
+    from prefetch import get_prefetcher
+    from singleflight import get_single_flight
+    from transport import get_transport
+
+    with st.sidebar.beta_expander("Debug timings", expanded=True):
+        summary = trace.summary()
+        if summary:
+            st.table(pd.DataFrame(summary).set_index("stage").round(1))
+        st.text("API routes")
+        st.json(get_transport().stats.snapshot())
+        st.text("Measurement store")
+        st.json(get_store().report())
+        st.text("Prefetch")
+        st.json(get_prefetcher().report())
+        st.text("Coalesced requests")
+        st.json(get_single_flight().report())
 
 
 def main():
@@ -255,6 +400,23 @@ def main():
     Main entry for the program to run
     :return: None
     """
+    if METRICS_ENABLED:
+        enable_metrics()
+    debug = st.sidebar.checkbox("Debug timings")
+    # Streamlit reuses the script thread between reruns, so the trace is always reset
+    trace = start_trace() if debug else None
+    set_trace(trace)
+    with stage("page"):
+        show_page()
+    if trace is not None:
+        debug_panel(trace)
+
+
+def show_page():
+    """
+    Page selected through the sidebar menus
+    :return: None
+    """
     # Available menu entries
     entry_menu = ["Home", "Login"]
     menu_choice = st.sidebar.selectbox("Menu", entry_menu)
@@ -267,20 +429,37 @@ def main():
         password = st.sidebar.text_input("Password", type="password")
 
         if st.sidebar.checkbox("Login"):
-            # Check the account status through ping
-            solar = SolarCheck(username, password)
-            account_data = solar.get_all_meters()
+            from account_cache import get_account_cache
+            from measurement_store import get_store
+            from planner import fetch_range
+            from prefetch import adjacent_months, get_prefetcher, recent_periods
+            from processing import CHANNELS, process_points, process_stats
+            from yearly import available_years
+
+            from api_access import SolarCheck
+
+            # Check the account status through ping. The client is cheap to build, its transport and store are
+            # shared by the process and the catalog comes from the account cache keyed by credential hashes
+            solar = SolarCheck(username, password, store=get_store())
+            refresh = st.sidebar.button("Refresh account data")
+            account_data = get_account_cache().get(solar, refresh=refresh)
             if account_data[0]:
                 # Sub menu after log in
-                logged_in_menu = ["Home", "Metering Points", "Statistics"]
+                logged_in_menu = ["Home", "Metering Points", "Statistics", "Fleet"]
                 action = st.sidebar.selectbox("Account Menu", logged_in_menu)
 
                 # Loading required data
-                connection_details = account_data[1][0]  # Get all metering points attached under the account
-                connection_id = connection_details["connectionId"]  # get connection id
-                metering_points = connection_details["meteringPoints"]  # Get list of metering point
-                ids = solar.process_mettering_points(
-                    metering_points)  # Get IDs and channels of each mettering point in array
+                catalog = account_data[1]  # Cached catalog of the metering points attached under the account
+                if len(catalog.connection_ids) > 1:
+                    catalog = catalog.view(st.sidebar.selectbox("Connection", catalog.connection_ids))
+                available_channels = catalog.available_channels()
+                solar.channels = st.sidebar.multiselect(
+                    "Channels", available_channels,
+                    default=[c for c in CHANNELS if c in available_channels]) or CHANNELS
+                connection_id = catalog.connection_id  # get connection id
+                metering_points = catalog.metering_points  # Get list of metering point
+                ids = catalog.ids()  # Get IDs and channels of each mettering point in array
+                get_prefetcher().submit(solar, catalog, recent_periods())  # Warm yesterday and this month
 
                 # Start processing menu selections
                 if action == "Home":
@@ -288,9 +467,13 @@ def main():
                 if action == "Metering Points":
                     process_meters(metering_points)
 
+                elif action == "Fleet":
+                    show_fleet(solar, catalog)
+
                 elif action == "Statistics":
-                    menu = ["Daily", "Monthly"]
+                    menu = ["Daily", "Monthly", "Yearly"]
                     choice = st.sidebar.selectbox("Time Frame", menu)
+                    lazy = st.sidebar.checkbox("One metering point at a time", value=True)
 
                     # Daily sub category
                     if choice == "Daily":
@@ -309,39 +492,13 @@ def main():
                                     f':calendar: Statistical data for {date_selection.day}.{date_selection.month}.'
                                     f'{date_selection.year}')
 
-                                # Expander
-                                merged_dataframes = list()
-
                                 data_expaned_stats = process_points(ids, solar, connection_id,
                                                                     selected_date=date_selection)
-                                final_data = process_stats(data_expaned_stats)
-                                string_build = str()
-                                with st.beta_expander("Get details per metering point"):
-                                    for point in final_data:
-                                        filtered = [x for x in point['stats'].keys() if int(x) in [10280, 16080]]
-                                        for chn_stats_cat in filtered:
-                                            channel_details = get_channel_details(metering_points=metering_points,
-                                                                                  metering_point_id=point[
-                                                                                      'meteringPointId'],
-                                                                                  channel_id=chn_stats_cat)
-                                            st.info(f"*** :sparkles: Metering point ID {point['meteringPointId']}***\n"
-                                                    f"\n > __Channel__: {channel_details['channel']}   | "
-                                                    f"__Direction__: {channel_details['direction']}  | "
-                                                    f"__Unit__: {channel_details['unit']}")
-                                            dataframe = solar.make_data_frame(data=point['stats'][chn_stats_cat],
-                                                                              column_name=chn_stats_cat)
-                                            total = produce_data_window(dataframe=dataframe, id=chn_stats_cat,
-                                                                        meter_unit=channel_details['unit'])
-                                            string_build += f'{total}\n'
-                                            merged_dataframes.append(dataframe)  # Append to list for futher analywsis
-
-                                st.success(f"*** :sparkles: Summary ***")
-                                all_together = reduce(lambda df_left, df_right: pd.merge(df_left, df_right,
-                                                                                         left_index=True,
-                                                                                         right_index=True,
-                                                                                         how='outer'),
-                                                      merged_dataframes)
-                                produce_total_windows(dataframe=all_together, total=string_build)
+                                final_data = process_stats(data_expaned_stats, channels=solar.channels)
+                                show_statistics(final_data, catalog, solar, connection_id, level="hour",
+                                                details_title="Get details per metering point",
+                                                summary_title=f"*** :sparkles: Summary ***", lazy=lazy,
+                                                start=date_selection, end=date_selection)
 
                             else:
                                 st.error("Please selected date which is older than today!")
@@ -354,55 +511,18 @@ def main():
                             start_date = st.sidebar.date_input("From", two_day_back)
                             end_date = st.sidebar.date_input("To", past_day)
                             if start_date < end_date < today:  # Check allowed range...
-                                merged_dataframes = list()
                                 st.warning(
-                                    f':calendar: Statistical data for range {two_day_back} to {past_day}')
-                                # current range difference
-                                data_expaned_stats = process_points(ids, solar, connection_id, past_day.month,
-                                                                    past_day.year,
-                                                                    monthly=True)
-                                final_data = process_stats(data_expaned_stats)
-                                string_build = str()
-                                with st.beta_expander("Get range details for metering point"):
-                                    for point in final_data:
-                                        if point:
-                                            filtered = [x for x in point['stats'].keys() if int(x) in [10280, 16080]]
-                                            for chn_stats_cat in filtered:
-                                                channel_details = get_channel_details(metering_points=metering_points,
-                                                                                      metering_point_id=point[
-                                                                                          'meteringPointId'],
-                                                                                      channel_id=chn_stats_cat)
-                                                st.info(
-                                                    f"*** :sparkles: Metering point ID {point['meteringPointId']}***\n"
-                                                    f"\n > __Channel__: {channel_details['channel']}   | "
-                                                    f"__Direction__: {channel_details['direction']}  | "
-                                                    f"__Unit__: {channel_details['unit']}")
-                                                dataframe = solar.filter_data_frame(data=point['stats'][chn_stats_cat],
-                                                                                    column_name=chn_stats_cat,
-                                                                                    start_date=start_date + timedelta(
-                                                                                        days=-1),
-                                                                                    end_date=end_date)
-                                                total_returned = produce_data_window(dataframe=dataframe,
-                                                                                     id=chn_stats_cat,
-                                                                                     meter_unit=channel_details['unit'])
-
-                                                merged_dataframes.append(
-                                                    dataframe)  # Append to list for futher analywsis
-                                                string_build += f'{total_returned}\n'
-
-                                        else:
-                                            pass
-                                st.success(f"*** :sparkles: Date Range Summary ***")
-                                all_together = reduce(lambda df_left, df_right: pd.merge(df_left, df_right,
-                                                                                         left_index=True,
-                                                                                         right_index=True,
-                                                                                         how='outer'),
-                                                      merged_dataframes)
-                                produce_total_windows(dataframe=all_together, total=string_build)
+                                    f':calendar: Statistical data for range {start_date} to {end_date}')
+                                data_expaned_stats = fetch_range(ids, solar, connection_id, start_date, end_date)
+                                final_data = process_stats(data_expaned_stats, channels=solar.channels)
+                                show_statistics(final_data, catalog, solar, connection_id, level="day",
+                                                details_title="Get range details for metering point",
+                                                summary_title=f"*** :sparkles: Date Range Summary ***", lazy=lazy,
+                                                start=start_date, end=end_date)
 
                             else:
-                                st.error('Wrong date range specified. Range queries are allowed only for given month'
-                                         ' up to TODAY-1 as system does not provide current day data.')
+                                st.error('Wrong date range specified. Range queries are allowed up to TODAY-1 as system'
+                                         ' does not provide current day data.')
 
                     # Monthly Sub category
                     elif choice == "Monthly":
@@ -412,47 +532,38 @@ def main():
                         selected_month = pos_month.selectbox(label='Month',
                                                              options=month_options,
                                                              index=month_options[today.month - 2])
-                        selected_year = pos_year.selectbox(label='Year', options=[2020, 2021, 2022])
+                        year_options = available_years(solar, connection_id, [i["meteringPointId"] for i in ids])
+                        selected_year = pos_year.selectbox(label='Year', options=year_options)
                         month_named = calendar.month_name[selected_month]
+                        get_prefetcher().submit(solar, catalog, adjacent_months(selected_year, selected_month))
 
-                        if selected_month <= today.month and selected_year <= today.year:
-                            merged_dataframes = list()
+                        if date(selected_year, selected_month, 1) < date.today():
                             st.warning(f'Getting data for {month_named} {selected_year}')
                             data_expaned_stats = process_points(ids, solar, connection_id, selected_month,
                                                                 selected_year,
                                                                 monthly=True)
-                            final_data = process_stats(data_expaned_stats)
-                            string_build = str()
-                            with st.beta_expander("Get details per metering point"):
-                                for point in final_data:
-                                    if point:
-                                        filtered = [x for x in point['stats'].keys() if int(x) in [10280, 16080]]
-                                        for chn_stats_cat in filtered:
-                                            channel_details = get_channel_details(metering_points=metering_points,
-                                                                                  metering_point_id=point[
-                                                                                      'meteringPointId'],
-                                                                                  channel_id=chn_stats_cat)
-                                            st.info(f"*** :sparkles: Metering point ID {point['meteringPointId']}***\n"
-                                                    f"\n > __Channel__: {channel_details['channel']}   | "
-                                                    f"__Direction__: {channel_details['direction']}  | "
-                                                    f"__Unit__: {channel_details['unit']}")
-                                            dataframe = solar.make_data_frame(data=point['stats'][chn_stats_cat],
-                                                                              column_name=chn_stats_cat)
-                                            total_returned = produce_data_window(dataframe=dataframe, id=chn_stats_cat,
-                                                                                 meter_unit=channel_details['unit'])
-                                            merged_dataframes.append(dataframe)  # Append to list for futher analywsis
-                                            string_build += f'{total_returned}\n'
-                                    else:
-                                        pass
-
-                            st.success(f"*** :sparkles: Summary ***")
-                            all_together = reduce(lambda df_left, df_right: pd.merge(df_left, df_right,
-                                                                                     left_index=True, right_index=True,
-                                                                                     how='outer'), merged_dataframes)
-                            produce_total_windows(dataframe=all_together, total=string_build)
+                            final_data = process_stats(data_expaned_stats, channels=solar.channels)
+                            show_statistics(final_data, catalog, solar, connection_id, level="day",
+                                            details_title="Get details per metering point",
+                                            summary_title=f"*** :sparkles: Summary ***", lazy=lazy,
+                                            start=date(selected_year, selected_month, 1),
+                                            end=date(selected_year, selected_month,
+                                                     calendar.monthrange(selected_year, selected_month)[1]))
                         else:
                             st.title("Get back to present or past")
 
+                    # Yearly Sub category
+                    elif choice == "Yearly":
+                        year_options = available_years(solar, connection_id, [i["meteringPointId"] for i in ids])
+                        selected_years = st.sidebar.multiselect("Years", year_options, default=year_options[:2])
+                        point_options = ["All"] + [i["meteringPointId"] for i in ids]
+                        selected_point = st.sidebar.selectbox("Metering point", point_options)
+                        if selected_years:
+                            show_years(solar, ids, connection_id, sorted(selected_years),
+                                       None if selected_point == "All" else selected_point)
+                        else:
+                            st.error("Please select at least one year!")
+
             else:
                 error_details = account_data[1]
                 st.error(f"{error_details['title']} or {error_details['type']} access")
@@ -0,0 +1,207 @@
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from api_access import SolarCheck, API_URL
+from exports import write_csv, write_parquet
+from fetcher import MAX_IN_FLIGHT
+from measurement_store import daily_period, is_final, monthly_period, period_end
+from processing import process_points
+from series import MeasurementSeries, day_bounds
+
+
+def months_between(start: date, end: date) -> list:
+    """
+    First day of every month touched by the range
+    :param start: First day
+    :param end: Last day
+    :return: list of dates
+    """
+    months = list()
+    current = start.replace(day=1)
+    while current <= end:
+        months.append(current)
+        current = (current + timedelta(days=32)).replace(day=1)
+    return months
+
+
+class Checkpoint:
+    def __init__(self, path: str):
+        """
+        Set of finished (connection, metering point, days of a month) parts kept on disk so interrupted runs resume
+        :param path: Location of the checkpoint file
+        """
+        self.path = path
+        self.done = set()
+        if os.path.exists(path):
+            with open(path) as source:
+                self.done = set(json.load(source)["done"])
+
+    @staticmethod
+    def key(connection_id, metering_point_id, first: date, last: date) -> str:
+        """
+        Key of the exported days, a wider range over the same month is a different part
+        :param first: First exported day of the month
+        :param last: Last exported day of the month
+        :return: str
+        """
+        return f"{connection_id}/{metering_point_id}/{first:%Y-%m-%d}/{last:%Y-%m-%d}"
+
+    def is_done(self, connection_id, metering_point_id, first: date, last: date) -> bool:
+        return self.key(connection_id, metering_point_id, first, last) in self.done
+
+    def mark(self, keys: list):
+        """
+        Record finished parts and write the file atomically
+        :param keys: Keys built by Checkpoint.key
+        :return: None
+        """
+        self.done.update(keys)
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as output:
+            json.dump({"done": sorted(self.done)}, output)
+        os.replace(temporary, self.path)
+
+
+def partition_path(output: str, connection_id, metering_point_id, channel: str, first: date, last: date,
+                   file_format: str) -> str:
+    """
+    File of the exported days, runs over other days of the same month write next to it
+    :param first: First exported day of the month
+    :param last: Last exported day of the month
+    :return: .../channel=<channel>/<first>_<last>.<file_format>
+    """
+    directory = os.path.join(output, f"connection={connection_id}", f"metering_point={metering_point_id}",
+                             f"channel={channel}")
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{first:%Y-%m-%d}_{last:%Y-%m-%d}.{file_format}")
+
+
+def remove_covered(path: str):
+    """
+    Remove the files of earlier runs whose days lie inside the days of the freshly written file
+    :param path: File written by partition_path
+    :return: None
+    """
+    directory, name = os.path.split(path)
+    stem, extension = os.path.splitext(name)
+    first, last = stem.split("_")
+    for other in os.listdir(directory):
+        other_stem, other_extension = os.path.splitext(other)
+        parts = other_stem.split("_")
+        if other == name or other_extension != extension or len(parts) != 2:
+            continue
+        # ISO dates compare as strings
+        if first <= parts[0] and parts[1] <= last:
+            os.remove(os.path.join(directory, other))
+
+
+def backfill(solar: SolarCheck, start: date, end: date, output: str, file_format: str = "parquet",
+             channels: list = None, max_in_flight: int = MAX_IN_FLIGHT, checkpoint: Checkpoint = None,
+             log=print) -> dict:
+    """
+    Download every channel of every metering point for the date range, one month at a time
+    :param solar: Client with the account credentials
+    :param start: First day to export
+    :param end: Last day to export
+    :param output: Root directory of the partitioned output
+    :param file_format: "parquet" or "csv"
+    :param channels: Channels to export, all when empty
+    :param max_in_flight: Parallel API requests
+    :param checkpoint: Progress of earlier runs
+    :param log: Function used for progress messages
+    :return: Throughput report
+    """
+    writer = write_parquet if file_format == "parquet" else write_csv
+    account_data = solar.get_all_meters()
+    if not account_data[0]:
+        raise RuntimeError(f"Login failed: {account_data[1]}")
+    first_ts, last_ts = day_bounds(start)[0], day_bounds(end)[1]
+    report = {"requests": 0, "failed": 0, "skipped": 0, "files": 0, "samples": 0}
+    started = time.perf_counter()
+
+    for month in months_between(start, end):
+        first, last = max(start, month), min(end, period_end(monthly_period(month.year, month.month)))
+        # Days which can still change are exported but not checkpointed, the next run exports them again
+        final = is_final(daily_period(last.year, last.month, last.day))
+        finished = list()
+        for connection in account_data[1]:
+            connection_id = connection["connectionId"]
+            ids = solar.process_mettering_points(connection["meteringPoints"])
+            pending = [p for p in ids
+                       if not (checkpoint and checkpoint.is_done(connection_id, p["meteringPointId"], first, last))]
+            report["skipped"] += len(ids) - len(pending)
+            fetched = process_points(pending, solar, connection_id, month.month, month.year, monthly=True,
+                                     max_in_flight=max_in_flight)
+            report["requests"] += len(pending)
+            report["failed"] += len(pending) - len(fetched)
+            for point in fetched:
+                for channel, series in point["stats"].items():
+                    if not isinstance(series, MeasurementSeries) or (channels and channel not in channels):
+                        continue
+                    series = series.between(first_ts, last_ts)
+                    if not len(series):
+                        continue
+                    path = partition_path(output, connection_id, point["meteringPointId"], channel, first, last,
+                                          file_format)
+                    writer(series.to_frame(channel), path)
+                    remove_covered(path)
+                    report["files"] += 1
+                    report["samples"] += len(series)
+                if final:
+                    finished.append(Checkpoint.key(connection_id, point["meteringPointId"], first, last))
+        # everything of the month is on disk before it counts as done
+        if checkpoint:
+            checkpoint.mark(finished)
+        elapsed = time.perf_counter() - started
+        log(f"{month:%Y-%m}: {report['samples']} samples, {report['files']} files, "
+            f"{report['samples'] / elapsed if elapsed else 0:.0f} samples/s")
+
+    report["seconds"] = time.perf_counter() - started
+    report["samples_per_second"] = report["samples"] / report["seconds"] if report["seconds"] else 0.0
+    report["requests_per_second"] = report["requests"] / report["seconds"] if report["seconds"] else 0.0
+    return report
+
+
+def parse_date(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Export metering data of every meter and channel without the "
+                                                 "dashboard")
+    parser.add_argument("--username", default=os.environ.get("PANNEL_USERNAME"))
+    parser.add_argument("--password", default=os.environ.get("PANNEL_PASSWORD"),
+                        help="defaults to PANNEL_PASSWORD, avoid passing it on the command line")
+    parser.add_argument("--start", type=parse_date, required=True, help="first day, YYYY-MM-DD")
+    parser.add_argument("--end", type=parse_date, default=date.today() - timedelta(days=1),
+                        help="last day, YYYY-MM-DD, yesterday by default")
+    parser.add_argument("--output", default="export")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--channel", action="append", help="channel to export, repeatable, all by default")
+    parser.add_argument("--workers", type=int, default=MAX_IN_FLIGHT, help="parallel API requests")
+    parser.add_argument("--checkpoint", help="progress file, <output>/_checkpoint.json by default")
+    parser.add_argument("--restart", action="store_true", help="ignore the progress of earlier runs")
+    parser.add_argument("--api-url", default=API_URL)
+    args = parser.parse_args(argv)
+    if not args.username or not args.password:
+        parser.error("credentials missing, use --username and PANNEL_PASSWORD")
+    if args.start > args.end:
+        parser.error("--start is after --end")
+
+    os.makedirs(args.output, exist_ok=True)
+    checkpoint_path = args.checkpoint or os.path.join(args.output, "_checkpoint.json")
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    solar = SolarCheck(args.username, args.password, api_url=args.api_url, channels=args.channel)
+    report = backfill(solar, args.start, args.end, args.output, file_format=args.format, channels=args.channel,
+                      max_in_flight=args.workers, checkpoint=Checkpoint(checkpoint_path))
+    print(json.dumps(report, indent=2))
+    return 0 if not report["failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""
+Alignment of channel frames: chained pd.merge versus align_frames.
+
+Run from the repository root:
+    python benchmarks/bench_align.py
+"""
+import os
+import sys
+import time
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alignment import align_frames  # noqa: E402
+
+CHANNELS = [2, 20, 200]
+# One month of 15 minute samples per channel
+SAMPLES = 31 * 24 * 4
+
+
+def make_frames(channels: int) -> list:
+    rng = np.random.default_rng(0)
+    index = pd.date_range("2021-01-01", periods=SAMPLES, freq="15min", name="snapshot")
+    frames = list()
+    for c in range(channels):
+        # every channel misses a few different samples so the outer join has work to do
+        keep = rng.random(SAMPLES) > 0.02
+        frames.append(pd.DataFrame({f"{10280 + c}": rng.random(keep.sum())}, index=index[keep]))
+    return frames
+
+
+def merge_chain(frames: list) -> pd.DataFrame:
+    return reduce(lambda df_left, df_right: pd.merge(df_left, df_right, left_index=True, right_index=True,
+                                                     how='outer'), frames)
+
+
+def timed(function, frames: list) -> tuple:
+    started = time.perf_counter()
+    result = function(frames)
+    return time.perf_counter() - started, result
+
+
+def main():
+    print(f"{'channels':>8} {'merge s':>9} {'align s':>9} {'speedup':>8} {'equal':>6}")
+    for channels in CHANNELS:
+        frames = make_frames(channels)
+        merge_time, merged = timed(merge_chain, frames)
+        align_time, aligned = timed(align_frames, frames)
+        equal = np.allclose(merged.to_numpy(), aligned.to_numpy(), equal_nan=True) and \
+            list(merged.columns) == list(aligned.columns) and \
+            np.array_equal(merged.index.values.astype("datetime64[ns]"), aligned.index.values)
+        print(f"{channels:>8} {merge_time:>9.3f} {align_time:>9.3f} {merge_time / align_time:>7.1f}x {equal!s:>6}")
+
+
+if __name__ == "__main__":
+    main()
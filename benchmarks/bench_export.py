@@ -0,0 +1,90 @@
+"""
+Exports: in-memory base64 data-URI path versus chunked writers streaming to disk.
+
+Every case runs in its own process, peak memory is the growth of the max RSS over the process
+baseline after the frame is built.
+
+Run from the repository root (xlsxwriter and pyarrow are needed):
+    python benchmarks/bench_export.py [rows]
+"""
+import base64
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exports import write_csv, write_parquet, write_xlsx, XLSX_MAX_ROWS  # noqa: E402
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    index = pd.date_range("2015-01-01", periods=rows, freq="15min", name="snapshot")
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({"10280": rng.random(rows), "16080": rng.random(rows)}, index=index)
+
+
+def legacy_csv(data_frame: pd.DataFrame, path: str):
+    text = data_frame.to_csv(index=True)
+    b64 = base64.b64encode(text.encode()).decode()
+    return f'<a href="data:file/txt;base64,{b64}" download="file.csv">Download</a>'
+
+
+def legacy_xlsx(data_frame: pd.DataFrame, path: str):
+    output = BytesIO()
+    writer = pd.ExcelWriter(output, engine='xlsxwriter')
+    data_frame.to_excel(writer, index=True, sheet_name='None')
+    writer.close()
+    b64 = base64.b64encode(output.getvalue())
+    return f'<a href="data:application/octet-stream;base64,{b64.decode()}" download="file.xlsx">Download</a>'
+
+
+CASES = {
+    "csv-legacy": legacy_csv,
+    "csv-stream": write_csv,
+    "xlsx-legacy": legacy_xlsx,
+    "xlsx-stream": write_xlsx,
+    "parquet-stream": write_parquet,
+}
+
+
+def max_rss() -> int:
+    # kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_case(case: str, rows: int):
+    frame = make_frame(rows)
+    if case.startswith("xlsx"):
+        # the legacy excel path can not go past one sheet
+        frame = frame.iloc[:min(rows, XLSX_MAX_ROWS - 1)]
+    baseline = max_rss()
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        CASES[case](frame, os.path.join(directory, "export"))
+        elapsed = time.perf_counter() - started
+    print(f"{len(frame)} {elapsed} {max_rss() - baseline}")
+
+
+def main():
+    print(f"{'case':<15} {'rows':>9} {'seconds':>8} {'peak MiB':>9}")
+    for case in CASES:
+        output = subprocess.run([sys.executable, __file__, f"{ROWS}", case], check=True, capture_output=True,
+                                text=True).stdout.split()
+        rows, elapsed, peak = int(output[0]), float(output[1]), int(output[2])
+        print(f"{case:<15} {rows:>9} {elapsed:>8.2f} {peak / 2 ** 20:>9.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        run_case(sys.argv[2], ROWS)
+    else:
+        main()
@@ -0,0 +1,80 @@
+"""
+Micro benchmark of the dataframe ingestion: per row python conversion versus the vectorized path.
+
+Run from the repository root:
+    python benchmarks/bench_frames.py
+"""
+import os
+import sys
+import time
+from datetime import date, datetime
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_access import SolarCheck  # noqa: E402
+
+SIZES = [1_000, 100_000, 1_000_000]
+INTERVAL = 15 * 60
+
+
+def make_samples(count: int) -> list:
+    start = int(datetime(2021, 1, 1).timestamp())
+    return [{"timestamp": start + i * INTERVAL, "value": float(i % 97), "origin": "measured", "status": "valid"}
+            for i in range(count)]
+
+
+def legacy_make_data_frame(data: list, column_name: str) -> pd.DataFrame:
+    for stat in data:
+        stat["snapshot"] = datetime.fromtimestamp(stat["timestamp"])
+    df = pd.DataFrame.from_dict(data)
+    df.drop(['origin', 'status', 'timestamp'], axis=1, inplace=True)
+    df.set_index("snapshot", inplace=True)
+    df.rename({'value': column_name}, axis='columns', inplace=True)
+    return df
+
+
+def legacy_filter_data_frame(data: list, column_name: str, start_date, end_date):
+    for stat in data:
+        stat["snapshot"] = datetime.fromtimestamp(stat["timestamp"])
+        stat.pop("origin")
+        stat.pop("status")
+    df = pd.DataFrame.from_dict(data)
+    df['timestamp'] = df.timestamp.apply(lambda x: datetime.fromtimestamp(x).date())
+    mask = (df['timestamp'] > start_date) & (df['timestamp'] <= end_date)
+    filtered_df = df.loc[mask].copy()
+    filtered_df.drop(['timestamp'], axis=1, inplace=True)
+    filtered_df.set_index("snapshot", inplace=True)
+    filtered_df.rename({'value': column_name}, axis='columns', inplace=True)
+    return filtered_df
+
+
+def timed(function, data_factory, *args) -> float:
+    data = data_factory()  # legacy path mutates the samples, every run gets its own copy
+    started = time.perf_counter()
+    function(data, *args)
+    return time.perf_counter() - started
+
+
+def main():
+    start_date, end_date = date(2021, 1, 10), date(2021, 2, 10)
+    print(f"{'samples':>10} {'case':<8} {'legacy s':>10} {'vector s':>10} {'speedup':>8}")
+    for size in SIZES:
+        samples = make_samples(size)
+
+        def factory():
+            return [dict(s) for s in samples]
+
+        cases = [
+            ("frame", legacy_make_data_frame, SolarCheck.make_data_frame, ("10280",)),
+            ("filter", legacy_filter_data_frame, SolarCheck.filter_data_frame, ("10280", start_date, end_date)),
+        ]
+        for name, legacy, vectorized, args in cases:
+            old = timed(legacy, factory, *args)
+            new = timed(vectorized, factory, *args)
+            print(f"{size:>10} {name:<8} {old:>10.3f} {new:>10.3f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Peak memory per channel-month: lists of sample dictionaries versus MeasurementSeries.
+
+Run from the repository root:
+    python benchmarks/bench_series.py
+"""
+import gc
+import json
+import os
+import sys
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from series import decode_measurements  # noqa: E402
+
+# 31 days of 15 minute samples
+SAMPLES_PER_MONTH = 31 * 24 * 4
+CHANNELS = [1, 12, 120]
+
+
+def make_payload(channels: int) -> bytes:
+    start = int(datetime(2021, 1, 1).timestamp())
+    response = {f"{10280 + c}": [{"timestamp": start + i * 900, "value": float(i % 97), "origin": "measured",
+                                  "status": "valid" if i % 50 else "estimated"}
+                                 for i in range(SAMPLES_PER_MONTH)]
+                for c in range(channels)}
+    return json.dumps(response).encode()
+
+
+def records_path(payload: bytes):
+    """Legacy flow: samples stay dictionaries, copied into the stats structure and framed with pandas"""
+    stats = json.loads(payload)
+    kept = {k: v for k, v in stats.items()}
+    frames = [pd.DataFrame.from_dict(samples) for samples in kept.values()]
+    return kept, frames
+
+
+def series_path(payload: bytes):
+    """Columnar flow: decoded once into arrays, frames share the value arrays"""
+    stats = decode_measurements(json.loads(payload))
+    frames = [series.to_frame(channel) for channel, series in stats.items()]
+    return stats, frames
+
+
+def measure(function, payload: bytes) -> tuple:
+    gc.collect()
+    tracemalloc.start()
+    result = function(payload)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return retained, peak
+
+
+def main():
+    print(f"{'channels':>8} {'path':<8} {'retained MiB':>13} {'peak MiB':>9} {'peak/channel-month KiB':>23}")
+    for channels in CHANNELS:
+        payload = make_payload(channels)
+        for name, function in (("records", records_path), ("series", series_path)):
+            retained, peak = measure(function, payload)
+            print(f"{channels:>8} {name:<8} {retained / 2 ** 20:>13.2f} {peak / 2 ** 20:>9.2f} "
+                  f"{peak / channels / 1024:>23.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Cold start: import time of the modules behind each page and time until the first statistics page has its data.
+
+Every stage runs in a fresh process against the local fake meetdata API, with an empty measurement store.
+Streamlit itself is left out, it is the same for every page and loads pandas before any module of the app.
+
+Run from the repository root:
+    python benchmarks/bench_startup.py --json startup.json
+    python benchmarks/bench_startup.py --baseline startup.json --tolerance 0.25   # exit 1 on regression
+    python benchmarks/bench_startup.py --budget first_page=1500                   # exit 1 above 1.5 s
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Modules each page imports, the welcome page only needs the instrumentation
+IMPORTS = {
+    "import_welcome": ["instrumentation"],
+    "import_login": ["account_cache", "measurement_store", "planner", "prefetch", "processing", "yearly"],
+    "import_all": ["account_cache", "measurement_store", "planner", "prefetch", "processing", "yearly", "fleet",
+                   "quality", "alignment", "rollups", "downsample", "exports"],
+}
+STAGES = list(IMPORTS) + ["first_page", "next_page"]
+
+
+def statistics_page(username: str, password: str) -> int:
+    """
+    Data of the daily statistics page for yesterday, as produced by the app after the login
+    :return: Number of channel tables built
+    """
+    from account_cache import get_account_cache
+    from api_access import SolarCheck
+    from measurement_store import get_store
+    from processing import CHANNELS, process_points, process_stats
+    from rollups import channel_rollup
+
+    cache = get_account_cache()
+    solar = SolarCheck(username, password, store=get_store())
+    solar.channels = CHANNELS
+    catalog = cache.get(solar)[1]
+    yesterday = date.today() - timedelta(days=1)
+    points = process_stats(process_points(catalog.ids(), solar, catalog.connection_id, selected_date=yesterday),
+                           channels=solar.channels)
+    tables = 0
+    for point in points:
+        for channel in point["stats"]:
+            channel_rollup(point["stats"][channel], "hour", solar.store, catalog.connection_id,
+                           point["meteringPointId"], channel).to_frame()
+            tables += 1
+    return tables
+
+
+def run_stage(stage: str):
+    """
+    Child process: time one stage and print {stage: seconds}
+    """
+    import pandas  # noqa: F401, already loaded by streamlit when the app starts
+
+    timings = dict()
+    started = time.perf_counter()
+    if stage in IMPORTS:
+        for module in IMPORTS[stage]:
+            __import__(module)
+        timings[stage] = time.perf_counter() - started
+    else:
+        statistics_page("user", "secret")
+        timings["first_page"] = time.perf_counter() - started
+        # Same page again in the same process: transport, catalog and store are reused
+        started = time.perf_counter()
+        statistics_page("user", "secret")
+        timings["next_page"] = time.perf_counter() - started
+    print(json.dumps(timings))
+
+
+def run_suite(iterations: int, meters: int) -> dict:
+    import numpy as np
+    from fake_meetdata import FakeMeetdata
+
+    fake = FakeMeetdata(meters=meters).start()
+    runs = {stage: list() for stage in STAGES}
+    try:
+        for _ in range(iterations):
+            for stage in list(IMPORTS) + ["first_page"]:
+                with tempfile.TemporaryDirectory() as directory:
+                    env = dict(os.environ, PANNEL_API_URL=fake.url, PANNEL_PREFETCH_AT="",
+                               PANNEL_STORE_PATH=os.path.join(directory, "store.sqlite"))
+                    output = subprocess.run([sys.executable, __file__, "--stage", stage], check=True,
+                                            capture_output=True, text=True, env=env, cwd=ROOT).stdout
+                for name, seconds in json.loads(output.splitlines()[-1]).items():
+                    runs[name].append(seconds)
+    finally:
+        fake.stop()
+
+    results = {"stages": dict()}
+    for stage, values in runs.items():
+        p50, p95 = np.percentile(values, [50, 95])
+        results["stages"][stage] = {"p50": p50, "p95": p95}
+    return results
+
+
+def print_report(results: dict):
+    print(f"{'stage':<16} {'p50 ms':>9} {'p95 ms':>9}")
+    for stage, percentiles in results["stages"].items():
+        print(f"{stage:<16} {percentiles['p50'] * 1000:>9.1f} {percentiles['p95'] * 1000:>9.1f}")
+
+
+def regressions(results: dict, baseline: dict, tolerance: float, min_delta: float, budgets: dict) -> list:
+    """
+    Stages slower than the baseline by more than the tolerance or above their budget
+    :param min_delta: Seconds of slowdown below which stages are treated as noise
+    :param budgets: {stage: seconds} upper bound of the median
+    :return: list of messages
+    """
+    found = list()
+    for stage, percentiles in results["stages"].items():
+        before = baseline.get("stages", dict()).get(stage)
+        if before and percentiles["p50"] > before["p50"] * (1 + tolerance) \
+                and percentiles["p50"] - before["p50"] > min_delta:
+            found.append(f"{stage}: p50 {before['p50'] * 1000:.1f} ms -> {percentiles['p50'] * 1000:.1f} ms")
+        if stage in budgets and percentiles["p50"] > budgets[stage]:
+            found.append(f"{stage}: p50 {percentiles['p50'] * 1000:.1f} ms over the budget of "
+                         f"{budgets[stage] * 1000:.0f} ms")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark")
+    parser.add_argument("--stage", choices=list(IMPORTS) + ["first_page"], help=argparse.SUPPRESS)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--meters", type=int, default=4, help="metering points on the fake account")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown as a fraction")
+    parser.add_argument("--min-delta", type=float, default=20, help="slowdown in ms ignored as noise")
+    parser.add_argument("--budget", action="append", default=list(), metavar="STAGE=MS",
+                        help="upper bound of the median of a stage, repeatable")
+    args = parser.parse_args()
+    if args.stage:
+        run_stage(args.stage)
+        return
+
+    budgets = {stage: float(ms) / 1000 for stage, ms in (budget.split("=") for budget in args.budget)}
+    results = run_suite(args.iterations, args.meters)
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+    baseline = dict()
+    if args.baseline:
+        with open(args.baseline) as source:
+            baseline = json.load(source)
+    found = regressions(results, baseline, args.tolerance, args.min_delta / 1000, budgets)
+    for message in found:
+        print(f"REGRESSION {message}")
+    if found:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
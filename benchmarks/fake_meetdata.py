@@ -0,0 +1,183 @@
+"""
+Local stand-in for webapi.meetdata.nl serving synthetic metering data.
+
+Run it on its own and point the dashboard at it:
+    python benchmarks/fake_meetdata.py --port 8600 --meters 20
+    PANNEL_API_URL=http://localhost:8600/api/1/ streamlit run appStream.py
+"""
+import argparse
+import base64
+import calendar
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from series import day_bounds  # noqa: E402
+
+MEASUREMENTS = re.compile(r"/api/1/measurements/(\d+)/(\d+)/(\d{4})/(\d{1,2})(?:/(\d{1,2}))?/?")
+# Production and consumption channels shown by the dashboard come first
+CHANNELS = [("10280", "KWH", "LVR"), ("16080", "KWH", "TLV"), ("10180", "KWH", "LVR"), ("16180", "KWH", "TLV"),
+            ("18160", "KW", "LVR"), ("18260", "KW", "TLV")]
+
+
+class FakeMeetdata:
+    def __init__(self, username: str = "user", password: str = "secret", connections: int = 1, meters: int = 4,
+                 channels: int = 2, interval: int = 900, latency: float = 0.0, error_rate: float = 0.0,
+                 gap_rate: float = 0.0, port: int = 0, seed: int = 0):
+        """
+        Synthetic meetdata API
+        :param username: Accepted user
+        :param password: Accepted password
+        :param connections: Number of connections on the account
+        :param meters: Metering points per connection
+        :param channels: Channels per metering point
+        :param interval: Seconds between samples
+        :param latency: Seconds every request is delayed
+        :param error_rate: Share of measurement requests answered with 503
+        :param gap_rate: Share of samples left out of the responses
+        :param port: Port to listen on, 0 picks a free one
+        :param seed: Seed of the error and gap generator
+        """
+        self.credentials = base64.b64encode(f"{username}:{password}".encode()).decode()
+        self.interval = interval
+        self.latency = latency
+        self.error_rate = error_rate
+        self.gap_rate = gap_rate
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.account = [{
+            "connectionId": 1000 + c,
+            "meteringPoints": [{
+                "meteringPointId": 871000000000000000 + c * 10000 + m,
+                "productType": "ELK",
+                "meteringPointType": "PV",
+                "meterNumber": f"M{c:03d}{m:05d}",
+                "channels": [{"channel": number, "unit": unit, "direction": direction}
+                             for number, unit, direction in CHANNELS[:channels]]
+            } for m in range(meters)]
+        } for c in range(connections)]
+        self.points = {f"{p['meteringPointId']}": p for conn in self.account for p in conn["meteringPoints"]}
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self.handler())
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}/api/1/"
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                with fake.lock:
+                    fake.requests += 1
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if self.headers.get("Authorization") != f"Basic {fake.credentials}":
+                    self.reply(401, {"title": "Unauthorized", "type": "unauthorized"})
+                    return
+                if self.path.rstrip("/") == "/api/1/meters":
+                    self.reply(200, fake.account)
+                    return
+                match = MEASUREMENTS.fullmatch(self.path)
+                if not match or match.group(2) not in fake.points:
+                    self.reply(404, {"title": "Not found", "type": "not_found"})
+                    return
+                with fake.lock:
+                    failed = fake.random.random() < fake.error_rate
+                if failed:
+                    self.reply(503, {"title": "Service unavailable", "type": "unavailable"})
+                    return
+                point, year, month = match.group(2), int(match.group(3)), int(match.group(4))
+                day = int(match.group(5)) if match.group(5) else None
+                self.reply(200, fake.measurements(point, year, month, day))
+
+            def reply(self, status: int, body):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", f"{len(payload)}")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def measurements(self, metering_point_id: str, year: int, month: int, day: int = None) -> dict:
+        """
+        Samples of every channel of the point for the day or month, nothing after yesterday
+        :return: {channel: [samples]}
+        """
+        first = date(year, month, day or 1)
+        last = date(year, month, day or calendar.monthrange(year, month)[1])
+        last = min(last, date.fromordinal(date.today().toordinal() - 1))
+        if last < first:
+            return {channel["channel"]: list() for channel in self.points[metering_point_id]["channels"]}
+        start, end = day_bounds(first)[0], day_bounds(last)[1]
+        timestamps = np.arange(start, end, self.interval, dtype=np.int64)
+        hours = (timestamps % 86400) / 3600
+        response = dict()
+        for channel in self.points[metering_point_id]["channels"]:
+            rng = np.random.default_rng([self.seed, int(metering_point_id) % 2 ** 32, int(channel["channel"]),
+                                         int(start)])
+            if channel["direction"] == "LVR":
+                values = np.clip(np.sin(np.pi * (hours - 5) / 14), 0, None) * rng.uniform(0.5, 1.5, len(hours))
+            else:
+                values = 0.2 + 0.3 * rng.random(len(hours))
+            values = np.round(values * self.interval / 3600, 3)
+            keep = rng.random(len(timestamps)) >= self.gap_rate
+            estimated = rng.random(len(timestamps)) < 0.01
+            response[channel["channel"]] = [
+                {"timestamp": int(ts), "value": float(value), "origin": "calculated" if est else "measured",
+                 "status": "estimated" if est else "valid"}
+                for ts, value, est, present in zip(timestamps, values, estimated, keep) if present]
+        return response
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the meetdata API")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--username", default="user")
+    parser.add_argument("--password", default="secret")
+    parser.add_argument("--connections", type=int, default=1)
+    parser.add_argument("--meters", type=int, default=4)
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--interval", type=int, default=900, help="seconds between samples")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--gap-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    fake = FakeMeetdata(username=args.username, password=args.password, connections=args.connections,
+                        meters=args.meters, channels=args.channels, interval=args.interval, latency=args.latency,
+                        error_rate=args.error_rate, gap_rate=args.gap_rate, port=args.port)
+    print(f"Serving fake meetdata API on {fake.url} (user {args.username})")
+    try:
+        fake.httpd.serve_forever()
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
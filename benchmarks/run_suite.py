@@ -0,0 +1,179 @@
+"""
+End to end benchmark of SolarCheck and the processing pipeline against the local fake meetdata API.
+
+Run from the repository root:
+    python benchmarks/run_suite.py
+    python benchmarks/run_suite.py --json results.json
+    python benchmarks/run_suite.py --baseline results.json --tolerance 0.25   # exit 1 on regression
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_access import SolarCheck  # noqa: E402
+from alignment import align_frames  # noqa: E402
+from account_cache import AccountCatalog  # noqa: E402
+from exports import write_csv, write_parquet  # noqa: E402
+from measurement_store import MeasurementStore  # noqa: E402
+from processing import process_points, process_stats  # noqa: E402
+from transport import Transport  # noqa: E402
+from fake_meetdata import FakeMeetdata  # noqa: E402
+
+SCENARIOS = {
+    "small": {"meters": 4, "channels": 2, "interval": 900, "latency": 0.01, "error_rate": 0.0},
+    "portfolio": {"meters": 50, "channels": 2, "interval": 900, "latency": 0.02, "error_rate": 0.02},
+    "dense": {"meters": 8, "channels": 6, "interval": 300, "latency": 0.01, "error_rate": 0.0},
+}
+STAGES = ["fetch_cold", "fetch_warm", "process_stats", "make_data_frame", "merge", "export"]
+CHANNELS = ["10280", "16080"]
+
+
+def last_full_month() -> date:
+    return date.today().replace(day=1) - timedelta(days=1)
+
+
+def run_pipeline(solar: SolarCheck, catalog: AccountCatalog, month: date, warm_solar: SolarCheck,
+                 directory: str) -> tuple:
+    """
+    One pass over every stage
+    :return: ({stage: seconds}, samples processed, requests sent)
+    """
+    timings = dict()
+    started = time.perf_counter()
+    fetched = process_points(catalog.ids(), solar, catalog.connection_id, month.month, month.year, monthly=True)
+    timings["fetch_cold"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    process_points(catalog.ids(), warm_solar, catalog.connection_id, month.month, month.year, monthly=True)
+    timings["fetch_warm"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    final_data = process_stats(fetched)
+    timings["process_stats"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    frames = list()
+    samples = 0
+    for point in final_data:
+        for channel in [c for c in point["stats"] if c in CHANNELS]:
+            frame = solar.make_data_frame(data=point["stats"][channel], column_name=channel)
+            samples += len(frame)
+            frames.append(frame)
+    timings["make_data_frame"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    merged = align_frames(frames)
+    timings["merge"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    write_csv(merged, os.path.join(directory, "export.csv"))
+    write_parquet(merged, os.path.join(directory, "export.parquet"))
+    timings["export"] = time.perf_counter() - started
+    return timings, samples, len(catalog.point_ids)
+
+
+def run_scenario(name: str, settings: dict, iterations: int, rate: float) -> dict:
+    fake = FakeMeetdata(**settings).start()
+    try:
+        transport = Transport(rate=rate, backoff=0.05)
+        solar = SolarCheck("user", "secret", transport=transport, api_url=fake.url)
+        catalog = AccountCatalog(solar.get_all_meters()[1])
+        warm_solar = SolarCheck("user", "secret", transport=transport, store=MeasurementStore(":memory:"),
+                                api_url=fake.url)
+        month = last_full_month()
+        process_points(catalog.ids(), warm_solar, catalog.connection_id, month.month, month.year, monthly=True)
+
+        runs = {stage: list() for stage in STAGES}
+        samples = requests = 0
+        total = 0.0
+        with tempfile.TemporaryDirectory() as directory:
+            for _ in range(iterations):
+                timings, samples, requests = run_pipeline(solar, catalog, month, warm_solar, directory)
+                for stage, seconds in timings.items():
+                    runs[stage].append(seconds)
+                total += sum(timings.values())
+            # separate pass for memory, tracing slows everything down
+            tracemalloc.start()
+            run_pipeline(solar, catalog, month, warm_solar, directory)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    finally:
+        fake.stop()
+
+    result = {"stages": dict(), "peak_mib": peak / 2 ** 20, "samples": samples,
+              "samples_per_second": samples * iterations / total if total else 0.0,
+              "requests_per_second": requests * iterations / sum(runs["fetch_cold"]) if runs["fetch_cold"] else 0.0,
+              "transport": transport.stats.snapshot()}
+    for stage, values in runs.items():
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        result["stages"][stage] = {"p50": p50, "p95": p95, "p99": p99}
+    return result
+
+
+def print_report(results: dict):
+    for name, result in results.items():
+        print(f"\n== {name}: {result['samples']} samples, {result['samples_per_second']:.0f} samples/s, "
+              f"{result['requests_per_second']:.1f} requests/s, peak {result['peak_mib']:.1f} MiB")
+        print(f"{'stage':<16} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for stage, percentiles in result["stages"].items():
+            print(f"{stage:<16} {percentiles['p50'] * 1000:>9.1f} {percentiles['p95'] * 1000:>9.1f} "
+                  f"{percentiles['p99'] * 1000:>9.1f}")
+
+
+def regressions(results: dict, baseline: dict, tolerance: float, min_delta: float) -> list:
+    """
+    Stages whose median got slower than the baseline by more than the tolerance
+    :param min_delta: Seconds of slowdown below which stages are treated as noise
+    :return: list of messages
+    """
+    found = list()
+    for name, result in results.items():
+        for stage, percentiles in result["stages"].items():
+            before = baseline.get(name, dict()).get("stages", dict()).get(stage)
+            if before and percentiles["p50"] > before["p50"] * (1 + tolerance) \
+                    and percentiles["p50"] - before["p50"] > min_delta:
+                found.append(f"{name}/{stage}: p50 {before['p50'] * 1000:.1f} ms -> {percentiles['p50'] * 1000:.1f} ms")
+        before = baseline.get(name, dict()).get("peak_mib")
+        if before and result["peak_mib"] > before * (1 + tolerance):
+            found.append(f"{name}: peak {before:.1f} MiB -> {result['peak_mib']:.1f} MiB")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run, repeatable, all by default")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--rate", type=float, default=0, help="client side rate limit, 0 disables it")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown as a fraction")
+    parser.add_argument("--min-delta", type=float, default=5, help="slowdown in ms ignored as noise")
+    args = parser.parse_args()
+
+    results = {name: run_scenario(name, SCENARIOS[name], args.iterations, args.rate)
+               for name in (args.scenario or SCENARIOS)}
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as source:
+            found = regressions(results, json.load(source), args.tolerance, args.min_delta / 1000)
+        for message in found:
+            print(f"REGRESSION {message}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
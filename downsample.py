@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+
+# Points per chart (or rows per table) sent to the browser
+CHART_POINT_BUDGET = 2000
+
+# Resampling steps to pick from, the finest one that fits into the budget is used
+RESOLUTIONS = ["15min", "30min", "1h", "3h", "6h", "12h", "1D", "7D", "30D"]
+
+# Units of quantities which add up over time, tables of every other unit (e.g. KW power) show the mean
+SUMMED_UNITS = ("KWH", "WH", "MWH", "M3")
+
+
+def table_method(unit: str) -> str:
+    """
+    Resampling which keeps the values of the unit meaningful in a coarser table
+    :param unit: Unit of the channel, e.g. "KWH" or "KW"
+    :return: "sum" for energy and volume, "mean" otherwise
+    """
+    return "sum" if f"{unit}".upper() in SUMMED_UNITS else "mean"
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets, positions of the points which keep the visual shape of the line
+    :param x: Sorted x values
+    :param y: y values
+    :param threshold: Number of points to keep
+    :return: Positions of the selected points
+    """
+    count = len(x)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+    # first and last point are always kept, the rest is split into threshold - 2 buckets
+    edges = np.linspace(1, count - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, count - 1
+    a = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_x, next_y = x[end:edges[bucket + 2]].mean(), y[end:edges[bucket + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[bucket + 1] = a
+    return selected
+
+
+def choose_frequency(index: pd.DatetimeIndex, budget: int) -> str:
+    """
+    Finest resolution which keeps the visible range inside the point budget
+    :param index: Time index of the data
+    :param budget: Maximum number of points
+    :return: pandas offset alias
+    """
+    span = index.max() - index.min()
+    for resolution in RESOLUTIONS:
+        if span / pd.Timedelta(resolution) <= budget:
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+def decimate(dataframe: pd.DataFrame, budget: int = CHART_POINT_BUDGET, method="lttb") -> pd.DataFrame:
+    """
+    Reduce the frame to roughly budget points before it is rendered, totals must use the full frame
+    :param dataframe: Time indexed frame
+    :param budget: Points per chart, shared between the columns
+    :param method: "lttb" for line shape, "mean" or "sum" for resampling to a coarser interval, or a list with
+                   "mean"/"sum" per column
+    :return: Decimated frame, the original one when it already fits
+    """
+    if len(dataframe) <= budget:
+        return dataframe
+    with stage("downsample"):
+        return _decimate(dataframe, budget, method)
+
+
+def _decimate(dataframe: pd.DataFrame, budget: int, method) -> pd.DataFrame:
+    if isinstance(method, (list, tuple)):
+        frequency = choose_frequency(dataframe.index, budget)
+        # Column by position, merged frames can repeat column names
+        parts = [_resample(dataframe.iloc[:, [position]], frequency, how) for position, how in enumerate(method)]
+        return pd.concat(parts, axis=1)
+    if method in ("mean", "sum"):
+        return _resample(dataframe, choose_frequency(dataframe.index, budget), method)
+    if method != "lttb":
+        raise ValueError(f"Unsupported decimation {method}")
+    x = dataframe.index.values.astype("datetime64[ns]").view(np.int64).astype(np.float64)
+    per_column = max(3, budget // dataframe.shape[1])
+    keep = list()
+    for column in range(dataframe.shape[1]):
+        y = dataframe.iloc[:, column].to_numpy(dtype=np.float64, na_value=np.nan)
+        present = np.flatnonzero(~np.isnan(y))
+        keep.append(present[lttb_indices(x[present], y[present], per_column)])
+    return dataframe.iloc[np.unique(np.concatenate(keep))]
+
+
+def _resample(dataframe: pd.DataFrame, frequency: str, method: str) -> pd.DataFrame:
+    if method not in ("mean", "sum"):
+        raise ValueError(f"Unsupported decimation {method}")
+    resampled = dataframe.resample(frequency)
+    return resampled.sum(min_count=1) if method == "sum" else resampled.mean()
@@ -0,0 +1,216 @@
+import os
+import re
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+# Rows written per chunk, bounds the memory used by a single export step
+CHUNK_ROWS = 100_000
+# Seconds an export stays downloadable
+EXPORT_TTL = 30 * 60
+# Excel can not hold more rows on one sheet, the rest continues on the next sheet
+XLSX_MAX_ROWS = 1_048_576
+# Interface and port of the download server, local only by default, 0 picks a free port
+EXPORT_HOST = os.environ.get("PANNEL_EXPORT_HOST", "127.0.0.1")
+EXPORT_PORT = int(os.environ.get("PANNEL_EXPORT_PORT", "8502"))
+# Address the browser uses to reach the export server, derived from the bound host and port when not set
+EXPORT_URL = os.environ.get("PANNEL_EXPORT_URL")
+
+FORMATS = {
+    "csv": ("csv", "text/csv"),
+    "xls": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "parquet": ("parquet", "application/octet-stream"),
+}
+
+
+def write_csv(data_frame: pd.DataFrame, path: str, chunk_rows: int = CHUNK_ROWS):
+    """
+    Write the frame to csv chunk by chunk
+    :param data_frame: pd.DataFrame
+    :param path: Output file
+    :param chunk_rows: Rows converted to text at once
+    :return: None
+    """
+    with open(path, "w", newline="") as output:
+        for start in range(0, max(len(data_frame), 1), chunk_rows):
+            data_frame.iloc[start:start + chunk_rows].to_csv(output, index=True, header=start == 0)
+
+
+def write_xlsx(data_frame: pd.DataFrame, path: str, chunk_rows: int = CHUNK_ROWS):
+    """
+    Write the frame to excel in constant memory mode, rows are flushed to disk as they are written
+    :param data_frame: pd.DataFrame
+    :param path: Output file
+    :param chunk_rows: Rows converted to python values at once
+    :return: None
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    number_format = workbook.add_format({"num_format": "0.00"})
+    date_format = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+    header = [f"{data_frame.index.name or ''}"] + [f"{c}" for c in data_frame.columns]
+    rows_per_sheet = XLSX_MAX_ROWS - 1
+    sheet_count = max(1, -(-len(data_frame) // rows_per_sheet))
+    for sheet_number in range(sheet_count):
+        worksheet = workbook.add_worksheet(f"Sheet{sheet_number + 1}")
+        worksheet.set_column(0, 0, 20, date_format)
+        worksheet.set_column(1, len(header) - 1, None, number_format)
+        worksheet.write_row(0, 0, header)
+        sheet_start = sheet_number * rows_per_sheet
+        sheet_end = min(sheet_start + rows_per_sheet, len(data_frame))
+        row = 1
+        for start in range(sheet_start, sheet_end, chunk_rows):
+            chunk = data_frame.iloc[start:min(start + chunk_rows, sheet_end)]
+            index = chunk.index.to_pydatetime() if isinstance(chunk.index, pd.DatetimeIndex) else chunk.index
+            values = chunk.to_numpy(dtype=object, copy=True)
+            values[pd.isna(values)] = None  # NaN stays an empty cell
+            for label, line in zip(index, values):
+                worksheet.write_row(row, 0, [label, *line])
+                row += 1
+    workbook.close()
+
+
+def unique_columns(columns) -> list:
+    """
+    Make repeated column names unique the way pandas read_csv does it (name, name.1, name.2, ...)
+    :param columns: Column names
+    :return: list of str
+    """
+    seen = dict()
+    names = list()
+    for column in columns:
+        column = f"{column}"
+        count = seen.get(column, 0)
+        seen[column] = count + 1
+        names.append(f"{column}.{count}" if count else column)
+    return names
+
+
+def write_parquet(data_frame: pd.DataFrame, path: str, chunk_rows: int = CHUNK_ROWS):
+    """
+    Write the frame to parquet, one row group per chunk
+    :param data_frame: pd.DataFrame
+    :param path: Output file
+    :param chunk_rows: Rows per row group
+    :return: None
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # parquet needs unique string column names, merged summaries can repeat channels of different meters
+    frame = data_frame.set_axis(unique_columns(data_frame.columns), axis=1)
+    writer = None
+    try:
+        for start in range(0, max(len(frame), 1), chunk_rows):
+            table = pa.Table.from_pandas(frame.iloc[start:start + chunk_rows], preserve_index=True)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+WRITERS = {"csv": write_csv, "xls": write_xlsx, "parquet": write_parquet}
+
+
+class ExportServer:
+    def __init__(self, host: str = EXPORT_HOST, port: int = EXPORT_PORT, base_url: str = EXPORT_URL,
+                 directory: str = None, ttl: float = EXPORT_TTL):
+        """
+        Small download endpoint streaming finished exports from disk
+        :param host: Interface the server listens on
+        :param port: Port the server listens on, 0 for any free port
+        :param base_url: Address the browser uses to reach the server, http://<host>:<bound port> when not given
+        :raises OSError: When the address can not be bound
+        :param directory: Where the export files are kept, temporary directory by default
+        :param ttl: Seconds until an export is removed
+        """
+        self.directory = directory or tempfile.mkdtemp(prefix="pannel_exports_")
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.exports = dict()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                match = re.fullmatch(r"/exports/([A-Za-z0-9_-]+)/[^/]+", self.path)
+                entry = server.exports.get(match.group(1)) if match else None
+                if entry is None or not os.path.exists(entry["path"]):
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", entry["content_type"])
+                self.send_header("Content-Length", f"{os.path.getsize(entry['path'])}")
+                self.send_header("Content-Disposition", f'attachment; filename="{entry["file_name"]}"')
+                self.end_headers()
+                with open(entry["path"], "rb") as source:
+                    shutil.copyfileobj(source, self.wfile, length=1024 * 1024)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self.httpd = ThreadingHTTPServer((host, port), Handler)
+        except OSError as error:
+            raise OSError(error.errno, f"Export server can not listen on {host}:{port} ({error.strerror}), "
+                                       f"set PANNEL_EXPORT_HOST/PANNEL_EXPORT_PORT to a free address") from error
+        if base_url is None:
+            shown = "localhost" if host in ("", "0.0.0.0", "127.0.0.1") else host
+            base_url = f"http://{shown}:{self.httpd.server_address[1]}"
+        self.base_url = base_url.rstrip("/")
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def export(self, data_frame: pd.DataFrame, file_name: str, file_type: str) -> str:
+        """
+        Write the frame to disk and register it for download
+        :param data_frame: pd.DataFrame
+        :param file_name: Name offered to the browser, extension is fixed to match the format
+        :param file_type: "csv", "xls" or "parquet"
+        :return: Download url
+        """
+        extension, content_type = FORMATS[file_type]
+        file_name = f"{os.path.splitext(os.path.basename(file_name))[0]}.{extension}"
+        token = secrets.token_urlsafe(16)
+        path = os.path.join(self.directory, f"{token}.{extension}")
+        WRITERS[file_type](data_frame, path)
+        with self.lock:
+            self.expire()
+            self.exports[token] = {"path": path, "file_name": file_name, "content_type": content_type,
+                                   "created": time.monotonic()}
+        return f"{self.base_url}/exports/{token}/{file_name}"
+
+    def expire(self):
+        """
+        Remove exports older than ttl, caller holds the lock
+        :return: None
+        """
+        now = time.monotonic()
+        for token in [t for t, e in self.exports.items() if now - e["created"] > self.ttl]:
+            entry = self.exports.pop(token)
+            if os.path.exists(entry["path"]):
+                os.remove(entry["path"])
+
+
+_default_server = None
+_default_lock = threading.Lock()
+
+
+def get_export_server() -> ExportServer:
+    """
+    Process wide export server, started on the first export
+    :return: ExportServer
+    :raises OSError: When the configured address can not be bound, the next call tries again
+    """
+    global _default_server
+    with _default_lock:
+        if _default_server is None:
+            _default_server = ExportServer()
+        return _default_server
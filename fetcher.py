@@ -0,0 +1,43 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from instrumentation import current_trace, set_trace
+
+# Upper bound of API requests in flight at the same time
+MAX_IN_FLIGHT = 8
+
+logger = logging.getLogger(__name__)
+
+
+def fetch_all(calls: list, max_in_flight: int = None) -> list:
+    """
+    Run API calls concurrently with bounded concurrency
+    :param calls: List of (function, args) tuples
+    :param max_in_flight: Maximum number of calls running at once, defaults to MAX_IN_FLIGHT
+    :return: Results in the same order as calls, calls failing on the network or on an undecodable response
+             return "api error", any other exception is raised
+    """
+    if not calls:
+        return list()
+    workers = min(max_in_flight or MAX_IN_FLIGHT, len(calls))
+    trace = current_trace()
+
+    def run(call):
+        function, args = call
+        previous = current_trace()
+        set_trace(trace)  # timings of the workers belong to the page run which started them
+        try:
+            return function(*args)
+        except (requests.RequestException, ValueError) as error:
+            # ValueError covers the JSON decoding of malformed responses
+            logger.warning("Dropped %s%s: %r", getattr(function, "__name__", function), args, error)
+            return "api error"
+        finally:
+            set_trace(previous)
+
+    if workers == 1:
+        return [run(call) for call in calls]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(run, calls))
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+from fetcher import fetch_all
+from instrumentation import stage
+from planner import plan_range, request_call, stitch
+from processing import CHANNELS
+from rollups import channel_rollup
+from series import TIMEZONE, MeasurementSeries, day_bounds
+
+
+def fetch_fleet(solar, catalog, start, end, max_in_flight: int = None) -> list:
+    """
+    Fetch the date range for the metering points of every connection in one bounded batch
+    :param solar: SolarCheck instance
+    :param catalog: AccountCatalog of the account
+    :param start: First day
+    :param end: Last day, inclusive
+    :param max_in_flight: Maximum number of parallel API requests
+    :return: Metering points with "connectionId" and "stats", points with a failed request are left out
+    """
+    plan = plan_range(start, end)
+    points = catalog.fleet()
+    calls = [request_call(solar, connection_id, point["meteringPointId"], request)
+             for connection_id, point in points for request in plan]
+    with stage("fetch"):
+        results = fetch_all(calls, max_in_flight=max_in_flight)
+    start_ts, end_ts = day_bounds(start)[0], day_bounds(end)[1]
+    fetched = list()
+    for position, (connection_id, point) in enumerate(points):
+        responses = results[position * len(plan):(position + 1) * len(plan)]
+        if all(isinstance(response, dict) for response in responses):
+            point["connectionId"] = connection_id
+            point["stats"] = stitch(responses, start_ts, end_ts)
+            fetched.append(point)
+    return fetched
+
+
+def fleet_summary(points: list, catalog, level: str = "day", store=None, channels: list = None,
+                  tz: str = TIMEZONE) -> tuple:
+    """
+    Totals of the fleet per meter and per channel and direction, built from the rollups only
+    :param points: Result of fetch_fleet
+    :param catalog: AccountCatalog for the channel details
+    :param level: Rollup level of the fleet series, "hour" or "day"
+    :param store: MeasurementStore holding the rollups or None
+    :param channels: Channels to include, defaults to CHANNELS
+    :param tz: Timezone of the series index
+    :return: (meter totals, group totals, fleet series) dataframes
+    """
+    selected = set(f"{c}" for c in (channels or CHANNELS))
+    with stage("fleet_summary"):
+        meters, buckets, sums, groups = list(), list(), list(), list()
+        for point in points:
+            for channel, series in point["stats"].items():
+                if not isinstance(series, MeasurementSeries) or channel not in selected:
+                    continue
+                details = catalog.get_channel_details(point["meteringPointId"], channel)
+                if details is None:
+                    continue
+                rollup = channel_rollup(series, level, store, point["connectionId"], point["meteringPointId"],
+                                        channel)
+                group = f"{channel} {details.get('direction', '')} {details.get('unit', '')}".strip()
+                meters.append({"connection": point["connectionId"], "meteringPointId": point["meteringPointId"],
+                               "group": group, "total": rollup.total(), "samples": int(rollup.count.sum()),
+                               "missing": int(rollup.missing.sum())})
+                buckets.append(rollup.buckets)
+                sums.append(rollup.sum)
+                groups.append(np.full(len(rollup), group, dtype=object))
+
+        meter_totals = pd.DataFrame(meters, columns=["connection", "meteringPointId", "group", "total", "samples",
+                                                     "missing"])
+        group_totals = meter_totals.groupby("group")[["total", "samples", "missing"]].sum()
+        group_totals["meters"] = meter_totals.groupby("group").size()
+        if not meters or not sum(len(b) for b in buckets):
+            return meter_totals, group_totals, pd.DataFrame()
+
+        # One bincount over every rollup bucket of every meter instead of aligning hundreds of frames
+        bucket_keys, bucket_index = np.unique(np.concatenate(buckets), return_inverse=True)
+        group_keys, group_index = np.unique(np.concatenate(groups).astype(str), return_inverse=True)
+        flat = group_index * len(bucket_keys) + bucket_index
+        matrix = np.bincount(flat, weights=np.concatenate(sums), minlength=len(group_keys) * len(bucket_keys))
+        index = pd.to_datetime(bucket_keys, unit="s", utc=True).tz_convert(tz).tz_localize(None)
+        series = pd.DataFrame(matrix.reshape(len(group_keys), len(bucket_keys)).T, columns=list(group_keys),
+                              index=pd.DatetimeIndex(index, name=level))
+        return meter_totals, group_totals, series
@@ -0,0 +1,162 @@
+import logging
+import os
+import threading
+import time
+
+# Expose the prometheus metrics endpoint when the app starts
+METRICS_ENABLED = os.environ.get("PANNEL_METRICS", "") == "1"
+METRICS_PORT = int(os.environ.get("PANNEL_METRICS_PORT", "8503"))
+
+_local = threading.local()
+_metrics = None
+# Set when the endpoint could not be started, the page runs are not retrying it
+_metrics_disabled = False
+_metrics_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+class Trace:
+    def __init__(self):
+        """
+        Timings collected while serving one page run
+        """
+        self.lock = threading.Lock()
+        self.entries = list()
+
+    def add(self, name: str, seconds: float):
+        with self.lock:
+            self.entries.append((name, seconds))
+
+    def summary(self) -> list:
+        """
+        Timings grouped by stage in order of the first appearance
+        :return: [{"stage", "calls", "total_ms", "max_ms"}]
+        """
+        grouped = dict()
+        with self.lock:
+            for name, seconds in self.entries:
+                entry = grouped.setdefault(name, {"stage": name, "calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+                entry["calls"] += 1
+                entry["total_ms"] += seconds * 1000
+                entry["max_ms"] = max(entry["max_ms"], seconds * 1000)
+        return list(grouped.values())
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_STAGE = _NullStage()
+
+
+class Stage:
+    __slots__ = ("name", "trace", "started")
+
+    def __init__(self, name: str, trace: Trace):
+        self.name = name
+        self.trace = trace
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe_stage(self.name, time.perf_counter() - self.started, self.trace)
+        return False
+
+
+def stage(name: str):
+    """
+    Context manager timing a processing stage, does nothing while neither metrics nor a trace are active
+    :param name: Stage label (e.g. "make_data_frame")
+    :return: context manager
+    """
+    trace = getattr(_local, "trace", None)
+    if _metrics is None and trace is None:
+        return NULL_STAGE
+    return Stage(name, trace)
+
+
+def observe_stage(name: str, seconds: float, trace: Trace = None):
+    if trace is not None:
+        trace.add(name, seconds)
+    if _metrics is not None:
+        _metrics["stage"].labels(stage=name).observe(seconds)
+
+
+def observe_route(route: str, seconds: float, status: str):
+    """
+    Record one HTTP attempt towards the API
+    :param route: API route label
+    :param seconds: Latency of the attempt
+    :param status: Response status code or "error" for connection failures
+    :return: None
+    """
+    trace = getattr(_local, "trace", None)
+    if trace is not None:
+        trace.add(f"http {route}", seconds)
+    if _metrics is not None:
+        _metrics["route"].labels(route=route, status=status).observe(seconds)
+
+
+def start_trace() -> Trace:
+    """
+    Collect timings of the current thread into a new trace
+    :return: Trace
+    """
+    _local.trace = Trace()
+    return _local.trace
+
+
+def current_trace():
+    return getattr(_local, "trace", None)
+
+
+def set_trace(trace):
+    """
+    Attach trace to the current thread, used to carry it into worker threads
+    :param trace: Trace or None
+    :return: None
+    """
+    _local.trace = trace
+
+
+def enable_metrics(port: int = METRICS_PORT) -> bool:
+    """
+    Start the prometheus endpoint once per process, metrics stay disabled when it can not be started
+    :param port: Port of the metrics endpoint
+    :return: Whether metrics are being exported
+    """
+    global _metrics, _metrics_disabled
+    with _metrics_lock:
+        if _metrics is not None:
+            return True
+        if _metrics_disabled:
+            return False
+        try:
+            from prometheus_client import Histogram, start_http_server
+        except ImportError:
+            logger.warning("prometheus_client is not installed, metrics are disabled")
+            _metrics_disabled = True
+            return False
+        try:
+            start_http_server(port)
+        except OSError as error:
+            logger.warning("Metrics endpoint can not listen on port %s (%s), metrics are disabled", port,
+                           error.strerror)
+            _metrics_disabled = True
+            return False
+        # Registered only once the endpoint is up, a second registration would raise
+        metrics = {
+            "route": Histogram("pannel_api_request_seconds", "Latency of meetdata API requests",
+                               ["route", "status"]),
+            "stage": Histogram("pannel_stage_seconds", "Duration of the processing stages", ["stage"]),
+        }
+        _metrics = metrics
+        return True
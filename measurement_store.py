@@ -0,0 +1,342 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from rollups import Rollup, local_starts
+from series import MeasurementSeries, day_bounds
+
+DEFAULT_PATH = os.environ.get("PANNEL_STORE_PATH",
+                              os.path.join(os.path.expanduser("~"), ".pannelapp", "measurements.sqlite3"))
+# Size cap of stored payloads before least recently used periods are evicted
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Seconds the periods which are still being filled (current day/month) stay fresh
+CURRENT_PERIOD_TTL = 15 * 60
+# Days after the end of a period when its data no longer changes
+SETTLE_DAYS = 1
+
+
+def daily_period(year: int, month: int, day: int) -> str:
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+def monthly_period(year: int, month: int) -> str:
+    return f"{year:04d}-{month:02d}"
+
+
+def period_end(period: str) -> date:
+    """
+    Last day covered by the period key
+    :param period: YYYY-MM or YYYY-MM-DD
+    :return: date
+    """
+    parts = [int(p) for p in period.split("-")]
+    if len(parts) == 3:
+        return date(*parts)
+    year, month = parts
+    first_of_next = date(year + month // 12, month % 12 + 1, 1)
+    return first_of_next - timedelta(days=1)
+
+
+def is_final(period: str, today: date = None) -> bool:
+    """
+    Check if the period is complete and will not change anymore
+    :param period: YYYY-MM or YYYY-MM-DD
+    :param today: Reference date, defaults to today
+    :return: Boolean
+    """
+    today = today or date.today()
+    return period_end(period) + timedelta(days=SETTLE_DAYS) <= today
+
+
+class MeasurementStore:
+    def __init__(self, path: str = DEFAULT_PATH, max_bytes: int = DEFAULT_MAX_BYTES,
+                 current_ttl: float = CURRENT_PERIOD_TTL):
+        """
+        Persistent SQLite cache of the measurement responses
+        :param path: Location of the database file, ":memory:" for a throw away store
+        :param max_bytes: Size cap of the stored payloads
+        :param current_ttl: Seconds until not finalized periods are refreshed
+        """
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.current_ttl = current_ttl
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS measurements (
+                connection_id TEXT NOT NULL,
+                metering_point_id TEXT NOT NULL,
+                channel TEXT NOT NULL,
+                period TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_ts INTEGER,
+                final INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                prefetched INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (connection_id, metering_point_id, channel, period)
+            )""")
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(measurements)")]
+        if "prefetched" not in columns:
+            self.connection.execute("ALTER TABLE measurements ADD COLUMN prefetched INTEGER NOT NULL DEFAULT 0")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS measurements_lru ON measurements (accessed_at)")
+        # Aggregates outlive evicted payloads, they are small and keep long horizon totals cheap
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS rollups (
+                connection_id TEXT NOT NULL,
+                metering_point_id TEXT NOT NULL,
+                channel TEXT NOT NULL,
+                level TEXT NOT NULL,
+                bucket INTEGER NOT NULL,
+                sum REAL NOT NULL,
+                min REAL,
+                max REAL,
+                count INTEGER NOT NULL,
+                missing INTEGER NOT NULL,
+                PRIMARY KEY (connection_id, metering_point_id, channel, level, bucket)
+            )""")
+        # Quality is analysed for the shown period on display, reports of earlier versions are not kept
+        self.connection.execute("DROP TABLE IF EXISTS quality")
+        self.connection.commit()
+        self.counters = {"hits": 0, "misses": 0, "bytes_read": 0, "bytes_written": 0, "evictions": 0,
+                         "prefetched": 0, "prefetch_used": 0}
+
+    def lookup(self, connection_id, metering_point_id, period: str, fresh_only: bool = True, count: bool = True):
+        """
+        Get all the cached channels of a metering point for the period
+        :param connection_id: Id of the connection
+        :param metering_point_id: Id of the metering point
+        :param period: YYYY-MM or YYYY-MM-DD
+        :param fresh_only: Ignore expired entries of periods which are not final
+        :param count: Add the outcome to the hit/miss counters
+        :return: ({channel: MeasurementSeries}, last_ts, final) or None when not cached
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT channel, payload, size, last_ts, final, fetched_at, prefetched FROM measurements "
+                "WHERE connection_id = ? AND metering_point_id = ? AND period = ?",
+                (str(connection_id), str(metering_point_id), period)).fetchall()
+            # Only the flag written with the data counts, a period saved while still open is expired once it ended
+            final = bool(rows) and all(row[4] for row in rows)
+            expired = bool(rows) and not final and (
+                is_final(period) or time.time() - min(row[5] for row in rows) > self.current_ttl)
+            if not rows or (fresh_only and expired):
+                if count:
+                    self.counters["misses"] += 1
+                return None
+            # First use of a prefetched period counts towards the prefetch hit ratio
+            if any(row[6] == 1 for row in rows):
+                self.counters["prefetch_used"] += 1
+            self.connection.execute(
+                "UPDATE measurements SET accessed_at = ?, prefetched = MIN(prefetched * 2, 2) "
+                "WHERE connection_id = ? AND metering_point_id = ? AND period = ?",
+                (time.time(), str(connection_id), str(metering_point_id), period))
+            self.connection.commit()
+            if count:
+                self.counters["hits"] += 1
+            self.counters["bytes_read"] += sum(row[2] for row in rows)
+            data = {row[0]: MeasurementSeries.from_bytes(row[1]) for row in rows}
+            last_ts = max((row[3] for row in rows if row[3] is not None), default=None)
+            return data, last_ts, final
+
+    def contains(self, connection_id, metering_point_id, period: str) -> bool:
+        """
+        Check for a fresh entry without touching the counters or the LRU order
+        :param connection_id: Id of the connection
+        :param metering_point_id: Id of the metering point
+        :param period: YYYY-MM or YYYY-MM-DD
+        :return: Boolean
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT final, fetched_at FROM measurements "
+                "WHERE connection_id = ? AND metering_point_id = ? AND period = ?",
+                (str(connection_id), str(metering_point_id), period)).fetchall()
+        if not rows:
+            return False
+        if all(row[0] for row in rows):
+            return True
+        return not is_final(period) and time.time() - min(row[1] for row in rows) <= self.current_ttl
+
+    def record(self, hit: bool):
+        """
+        Count a lookup which was resolved outside of lookup()
+        :param hit: Whether the data was served from the store
+        :return: None
+        """
+        with self.lock:
+            self.counters["hits" if hit else "misses"] += 1
+
+    def save(self, connection_id, metering_point_id, period: str, data: dict, prefetched: bool = False):
+        """
+        Store the API response of the metering point for the period
+        :param connection_id: Id of the connection
+        :param metering_point_id: Id of the metering point
+        :param period: YYYY-MM or YYYY-MM-DD
+        :param data: Decoded response from the measurements API {channel: MeasurementSeries}
+        :param prefetched: Stored by the background prefetcher and not requested by a user
+        :return: None
+        """
+        final = is_final(period)
+        now = time.time()
+        rows = list()
+        for channel, series in data.items():
+            if not isinstance(series, MeasurementSeries):
+                continue
+            payload = series.to_bytes()
+            rows.append((str(connection_id), str(metering_point_id), str(channel), period, payload, len(payload),
+                         series.last_timestamp(), int(final), now, now, int(prefetched)))
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO measurements (connection_id, metering_point_id, channel, period, payload, "
+                "size, last_ts, final, fetched_at, accessed_at, prefetched) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows)
+            self.counters["bytes_written"] += sum(row[5] for row in rows)
+            if prefetched and rows:
+                self.counters["prefetched"] += 1
+            for channel, series in data.items():
+                if isinstance(series, MeasurementSeries):
+                    self.update_rollups(connection_id, metering_point_id, channel, series)
+            self.evict()
+            self.connection.commit()
+
+    def update_rollups(self, connection_id, metering_point_id, channel, series: MeasurementSeries):
+        """
+        Replace the hourly buckets covered by the series and rebuild the days and months they belong to,
+        caller holds the lock
+        :param connection_id: Id of the connection
+        :param metering_point_id: Id of the metering point
+        :param channel: Channel of the series
+        :param series: Freshly stored samples
+        :return: None
+        """
+        hourly = Rollup.from_series(series)
+        if not len(hourly):
+            return
+        key = (str(connection_id), str(metering_point_id), str(channel))
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO rollups VALUES (?, ?, ?, 'hour', ?, ?, ?, ?, ?, ?)",
+            [key + row for row in hourly.rows()])
+        # Months touched by the new buckets are rebuilt from all of their stored hours
+        months = local_starts(hourly.buckets[[0, -1]], "month")
+        last_month_end = local_starts(np.array([months[-1] + 32 * 86400]), "month")[0]
+        hours = self.read_rollup(key, "hour", int(months[0]), int(last_month_end))
+        for level in ("day", "month"):
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO rollups VALUES (?, ?, ?, '{level}', ?, ?, ?, ?, ?, ?)",
+                [key + row for row in hours.regroup(level).rows()])
+
+    def read_rollup(self, key: tuple, level: str, start_ts: int, end_ts: int) -> Rollup:
+        rows = self.connection.execute(
+            "SELECT bucket, sum, min, max, count, missing FROM rollups WHERE connection_id = ? "
+            "AND metering_point_id = ? AND channel = ? AND level = ? AND bucket >= ? AND bucket < ? "
+            "ORDER BY bucket", key + (level, start_ts, end_ts)).fetchall()
+        return Rollup.from_rows(level, rows)
+
+    def rollup(self, connection_id, metering_point_id, channel, level: str, start_ts: int, end_ts: int) -> Rollup:
+        """
+        Stored aggregates of the channel
+        :param connection_id: Id of the connection
+        :param metering_point_id: Id of the metering point
+        :param channel: Channel id
+        :param level: "hour", "day" or "month"
+        :param start_ts: First bucket start included
+        :param end_ts: Bucket starts before this unix timestamp are included
+        :return: Rollup, empty when nothing is stored
+        """
+        with self.lock:
+            return self.read_rollup((str(connection_id), str(metering_point_id), str(channel)), level, start_ts,
+                                    end_ts)
+
+    def evict(self):
+        """
+        Drop least recently used periods until the store fits into max_bytes, caller holds the lock
+        All channels of a metering point and period go together, a lookup needs every one of them
+        :return: None
+        """
+        total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM measurements").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        cursor = self.connection.execute(
+            "SELECT connection_id, metering_point_id, period, SUM(size), COUNT(*) FROM measurements "
+            "GROUP BY connection_id, metering_point_id, period ORDER BY MAX(accessed_at)")
+        victims = list()
+        evicted = 0
+        for row in cursor:
+            if total <= self.max_bytes:
+                break
+            victims.append(row[:3])
+            total -= row[3]
+            evicted += row[4]
+        self.connection.executemany(
+            "DELETE FROM measurements WHERE connection_id = ? AND metering_point_id = ? AND period = ?", victims)
+        self.counters["evictions"] += evicted
+
+    def report(self) -> dict:
+        """
+        Hit/miss counters together with the current size of the store
+        :return: dict
+        """
+        with self.lock:
+            entries, size = self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM measurements").fetchone()
+            report = dict(self.counters)
+        lookups = report["hits"] + report["misses"]
+        report["hit_ratio"] = report["hits"] / lookups if lookups else 0.0
+        report["prefetch_hit_ratio"] = report["prefetch_used"] / report["prefetched"] if report["prefetched"] else 0.0
+        report["entries"] = entries
+        report["size"] = size
+        return report
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM measurements")
+            self.connection.execute("DELETE FROM rollups")
+            self.connection.commit()
+
+
+def samples_for_day(data: dict, day: date) -> dict:
+    """
+    Cut out samples of one day from the monthly response
+    :param data: {channel: MeasurementSeries}
+    :param day: Day to keep
+    :return: {channel: MeasurementSeries}
+    """
+    start, end = day_bounds(day)
+    return {channel: series.between(start, end) for channel, series in data.items()}
+
+
+def merge_samples(old: dict, new: dict) -> dict:
+    """
+    Merge freshly fetched samples into the stored ones, newer values win
+    :param old: {channel: MeasurementSeries}
+    :param new: {channel: MeasurementSeries}
+    :return: {channel: MeasurementSeries} sorted by timestamp
+    """
+    return {channel: MeasurementSeries.concat([old.get(channel, MeasurementSeries.empty()),
+                                               new.get(channel, MeasurementSeries.empty())])
+            for channel in set(old) | set(new)}
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_store() -> MeasurementStore:
+    """
+    Process wide measurement store shared by all the sessions
+    :return: MeasurementStore
+    """
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = MeasurementStore()
+        return _default_store
@@ -0,0 +1,86 @@
+import calendar
+from datetime import date, timedelta
+
+from fetcher import fetch_all
+from instrumentation import stage
+from series import MeasurementSeries, day_bounds
+
+
+def plan_range(start: date, end: date) -> list:
+    """
+    Smallest set of API requests covering every day from start up to and including end.
+    Months with a single requested day use the daily endpoint, every other month one monthly request.
+    :param start: First day
+    :param end: Last day
+    :return: [("daily", year, month, day) | ("monthly", year, month)] in time order
+    """
+    plan = list()
+    current = start
+    while current <= end:
+        last_of_month = current.replace(day=calendar.monthrange(current.year, current.month)[1])
+        if min(end, last_of_month) == current:
+            plan.append(("daily", current.year, current.month, current.day))
+        else:
+            plan.append(("monthly", current.year, current.month))
+        current = last_of_month + timedelta(days=1)
+    return plan
+
+
+def request_call(solar, connection_id, metering_point_id, request: tuple) -> tuple:
+    """
+    (function, args) pair for fetch_all
+    :param solar: SolarCheck instance
+    :param connection_id: Id of the connection
+    :param metering_point_id: Id of the metering point
+    :param request: Entry of plan_range
+    :return: tuple
+    """
+    if request[0] == "daily":
+        return solar.get_daily, (connection_id, metering_point_id) + request[1:]
+    return solar.get_monthly, (connection_id, metering_point_id) + request[1:]
+
+
+def stitch(responses: list, start_ts: int, end_ts: int) -> dict:
+    """
+    Join the responses of one metering point into one continuous series per channel
+    :param responses: Decoded API responses in plan order
+    :param start_ts: First unix timestamp kept
+    :param end_ts: Unix timestamp after the last one kept
+    :return: {channel: MeasurementSeries}, other entries of the responses are kept as they are
+    """
+    parts = dict()
+    stitched = dict()
+    for response in responses:
+        for channel, value in response.items():
+            if isinstance(value, MeasurementSeries):
+                parts.setdefault(channel, list()).append(value)
+            else:
+                stitched[channel] = value
+    for channel, series in parts.items():
+        stitched[channel] = MeasurementSeries.concat(series).between(start_ts, end_ts)
+    return stitched
+
+
+def fetch_range(ids: list, solar, connection_id, start: date, end: date, max_in_flight: int = None) -> list:
+    """
+    Fetch the date range for every metering point in one batch of planned requests
+    :param ids: Metering points as returned by SolarCheck.process_mettering_points
+    :param solar: SolarCheck instance
+    :param connection_id: Id of the connection
+    :param start: First day
+    :param end: Last day, inclusive
+    :param max_in_flight: Maximum number of parallel API requests
+    :return: Metering points with "stats" holding the stitched series, points with a failed request are left out
+    """
+    plan = plan_range(start, end)
+    calls = [request_call(solar, connection_id, id["meteringPointId"], request) for id in ids for request in plan]
+    with stage("fetch"):
+        results = fetch_all(calls, max_in_flight=max_in_flight)
+    start_ts, end_ts = day_bounds(start)[0], day_bounds(end)[1]
+    new_structure = list()
+    for position, id in enumerate(ids):
+        responses = results[position * len(plan):(position + 1) * len(plan)]
+        if all(isinstance(response, dict) for response in responses):
+            id['stats'] = stitch(responses, start_ts, end_ts)
+            new_structure.append(id)
+    return new_structure
@@ -0,0 +1,232 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from singleflight import credential_hash
+from measurement_store import CURRENT_PERIOD_TTL, daily_period, monthly_period
+
+# Local time of the daily warm up of every account seen within ACCOUNT_TTL, HH:MM, empty disables it
+PREFETCH_AT = os.environ.get("PANNEL_PREFETCH_AT", "06:00")
+# Prefetch requests running at once, kept low so user requests keep the rate limiter budget
+PREFETCH_WORKERS = int(os.environ.get("PANNEL_PREFETCH_WORKERS", "2"))
+# Seconds an account is kept for the daily warm up after its last page view
+ACCOUNT_TTL = 24 * 60 * 60
+
+
+def recent_periods(today: date = None) -> list:
+    """
+    Periods most pages ask for: yesterday and the month up to yesterday
+    :param today: Reference date, defaults to today
+    :return: [("daily", year, month, day), ("monthly", year, month)]
+    """
+    yesterday = (today or date.today()) - timedelta(days=1)
+    return [("daily", yesterday.year, yesterday.month, yesterday.day),
+            ("monthly", yesterday.year, yesterday.month)]
+
+
+def adjacent_months(year: int, month: int, today: date = None) -> list:
+    """
+    Months before and after the browsed one which already have data
+    :param year: Browsed year
+    :param month: Browsed month
+    :param today: Reference date, defaults to today
+    :return: [("monthly", year, month)]
+    """
+    today = today or date.today()
+    first = date(year, month, 1)
+    previous = (first - timedelta(days=1)).replace(day=1)
+    following = (first + timedelta(days=32)).replace(day=1)
+    return [("monthly", m.year, m.month) for m in (previous, following) if m < today]
+
+
+def period_key(request: tuple) -> str:
+    return daily_period(*request[1:]) if request[0] == "daily" else monthly_period(*request[1:])
+
+
+class Prefetcher:
+    def __init__(self, max_workers: int = PREFETCH_WORKERS, daily_at: str = PREFETCH_AT,
+                 min_interval: float = CURRENT_PERIOD_TTL):
+        """
+        Background warm up of the measurement store
+        :param max_workers: Prefetch requests running at once
+        :param daily_at: Local time HH:MM of the daily warm up, empty to disable
+        :param min_interval: Seconds before the same account and periods are warmed again
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="prefetch")
+        self.daily_at = daily_at
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.pending = dict()
+        self.warmed = dict()
+        self.accounts = dict()
+        self.users = dict()
+        self.stopped = threading.Event()
+        self.counters = {"scheduled": 0, "fetched": 0, "skipped": 0, "failed": 0, "cancelled": 0}
+        self.scheduler = None
+        if daily_at:
+            self.scheduler = threading.Thread(target=self.run_daily, name="prefetch-scheduler", daemon=True)
+            self.scheduler.start()
+
+    def submit(self, solar, catalog, requests: list, seen: bool = True) -> int:
+        """
+        Queue prefetch of the periods for every metering point of the account
+        :param solar: SolarCheck with a store attached
+        :param catalog: AccountCatalog of the account
+        :param requests: Periods as returned by recent_periods/adjacent_months
+        :param seen: Asked for by a page view, keeps the account for the daily warm up another ACCOUNT_TTL
+        :return: Number of newly queued jobs
+        """
+        if solar.store is None or self.stopped.is_set():
+            return 0
+        user = credential_hash(solar.username, solar.password)
+        now = time.monotonic()
+        if seen:
+            replaced = self.remember(user, solar, catalog, now)
+            if replaced is not None:
+                # Credentials of the username changed, the old ones are not used again
+                self.cancel(replaced.username, replaced.password)
+        warm_key = (user, catalog.connection_id, tuple(requests))
+        queued = 0
+        with self.lock:
+            # Every streamlit rerun asks again, the same warm up is not repeated within min_interval
+            if now - self.warmed.get(warm_key, -self.min_interval) < self.min_interval:
+                return 0
+            self.warmed[warm_key] = now
+            for point_id in [point["meteringPointId"] for point in catalog.point_ids]:
+                for request in requests:
+                    key = (user, catalog.connection_id, point_id, period_key(request))
+                    if key in self.pending:
+                        continue
+                    self.pending[key] = self.executor.submit(self.run, key, solar, catalog.connection_id, point_id,
+                                                             request)
+                    queued += 1
+            self.counters["scheduled"] += queued
+        return queued
+
+    def remember(self, user: str, solar, catalog, now: float):
+        """
+        Keep the account for the daily warm up
+        :return: SolarCheck of the same username with other credentials or None
+        """
+        with self.lock:
+            previous = self.users.get(solar.username)
+            self.users[solar.username] = user
+            self.accounts[user] = (now, solar, catalog)
+            if previous is not None and previous != user and previous in self.accounts:
+                return self.accounts[previous][1]
+        return None
+
+    def run(self, key: tuple, solar, connection_id, point_id, request: tuple):
+        try:
+            if self.stopped.is_set():
+                return
+            store = solar.store
+            period = period_key(request)
+            if store.contains(connection_id, point_id, period):
+                self.count("skipped")
+                return
+            if request[0] == "daily":
+                data = solar.fetch_daily(connection_id, point_id, *request[1:])
+            else:
+                data = solar.fetch_monthly(connection_id, point_id, *request[1:])
+            if isinstance(data, dict):
+                store.save(connection_id, point_id, period, data, prefetched=True)
+                self.count("fetched")
+            else:
+                self.count("failed")
+        except Exception:
+            self.count("failed")
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+
+    def count(self, name: str):
+        with self.lock:
+            self.counters[name] += 1
+
+    def cancel(self, username: str = None, password: str = None) -> int:
+        """
+        Drop queued jobs which did not start yet, running requests finish
+        :param username: Only jobs of this account, all accounts when not given
+        :param password: Password of the account
+        :return: Number of cancelled jobs
+        """
+        user = credential_hash(username, password) if username is not None else None
+        with self.lock:
+            keys = [key for key in self.pending if user is None or key[0] == user]
+            cancelled = [key for key in keys if self.pending[key].cancel()]
+            for key in cancelled:
+                self.pending.pop(key, None)
+            if user is not None:
+                self.accounts.pop(user, None)
+                if self.users.get(username) == user:
+                    del self.users[username]
+                self.warmed = {k: v for k, v in self.warmed.items() if k[0] != user}
+            self.counters["cancelled"] += len(cancelled)
+        return len(cancelled)
+
+    def seconds_until_next_run(self, now: datetime = None) -> float:
+        now = now or datetime.now()
+        hour, minute = (int(part) for part in self.daily_at.split(":"))
+        next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        return (next_run - now).total_seconds()
+
+    def run_daily(self):
+        """
+        Warm the recent periods of every known account at the configured time of the day, accounts not seen
+        within ACCOUNT_TTL are dropped together with their credentials
+        :return: None
+        """
+        while not self.stopped.wait(self.seconds_until_next_run()):
+            for solar, catalog in self.active_accounts():
+                self.submit(solar, catalog, recent_periods(), seen=False)
+
+    def active_accounts(self, now: float = None) -> list:
+        """
+        Drop the accounts not seen within ACCOUNT_TTL and forget what was warmed
+        :return: [(SolarCheck, AccountCatalog)] of the remaining accounts
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            expired = [solar for seen, solar, _ in self.accounts.values() if now - seen > ACCOUNT_TTL]
+            active = [(solar, catalog) for seen, solar, catalog in self.accounts.values()
+                      if now - seen <= ACCOUNT_TTL]
+            self.warmed.clear()
+        for solar in expired:
+            self.cancel(solar.username, solar.password)
+        return active
+
+    def report(self) -> dict:
+        with self.lock:
+            report = dict(self.counters)
+            report["pending"] = len(self.pending)
+        return report
+
+    def stop(self):
+        """
+        Cancel everything queued and end the scheduler
+        :return: None
+        """
+        self.stopped.set()
+        self.cancel()
+        self.executor.shutdown(wait=False)
+
+
+_default_prefetcher = None
+_default_lock = threading.Lock()
+
+
+def get_prefetcher() -> Prefetcher:
+    """
+    Process wide prefetcher shared by all the sessions
+    :return: Prefetcher
+    """
+    global _default_prefetcher
+    with _default_lock:
+        if _default_prefetcher is None:
+            _default_prefetcher = Prefetcher()
+        return _default_prefetcher
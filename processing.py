@@ -0,0 +1,63 @@
+import os
+
+from fetcher import fetch_all
+from instrumentation import stage
+
+# Channels shown and fetched by default, comma separated ids
+CHANNELS = [c.strip() for c in os.environ.get("PANNEL_CHANNELS", "10280,16080").split(",") if c.strip()]
+
+
+def process_points(ids: list, solar, connection_id, month=None, year=None, selected_date=None,
+                   monthly: bool = False, max_in_flight: int = None) -> list:
+    """
+    Filters all the points available
+    :param ids: Point Ids
+    :param solar: Solar Class to access class functions
+    :param connection_id: Id as int
+    :param month: month
+    :param year: year
+    :param selected_date: selection box
+    :param monthly: Boolean if monthly stats are for processing
+    :param max_in_flight: Maximum number of parallel API requests
+    :return: List of processed data
+    """
+    if not monthly:
+        calls = [(solar.get_daily, (connection_id, id["meteringPointId"], selected_date.year, selected_date.month,
+                                    selected_date.day)) for id in ids]
+    else:
+        calls = [(solar.get_monthly, (connection_id, id["meteringPointId"], year, month)) for id in ids]
+    with stage("fetch"):
+        results = fetch_all(calls, max_in_flight=max_in_flight)
+    new_structure = list()
+    for id, id_values in zip(ids, results):
+        if isinstance(id_values, dict):
+            id['stats'] = id_values
+            new_structure.append(id)
+    return new_structure
+
+
+def make_new_dictionary(old_one: dict):
+    """
+    Creates new dictionary from the old one without the channel (numeric) keys
+    :param old_one:
+    :return:
+    """
+    return {k: v for k, v in old_one.items() if not f"{k}".isdigit()}
+
+
+def process_stats(data: list, channels: list = None) -> list:
+    """
+    Process stats to filter out just the ones needed and construct new structure for processing
+    :param data: list of all the stats from API
+    :param channels: Channels to keep, defaults to CHANNELS
+    :return: Restructured stats
+    """
+    selected = set(f"{c}" for c in (channels or CHANNELS))
+    with stage("process_stats"):
+        new_structure = list()
+        # Process every meter
+        for meter in data:
+            updated_meter = make_new_dictionary(old_one=meter)
+            updated_meter["stats"] = {k: v for k, v in meter["stats"].items() if f"{k}" in selected}
+            new_structure.append(updated_meter)
+        return new_structure
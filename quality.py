@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+from series import ORIGINS, STATUSES, MeasurementSeries
+
+# Modified z-score above which a value counts as outlier (Iglewicz and Hoaglin)
+OUTLIER_Z = 3.5
+# Scale of the mean absolute deviation used when more than half of the values are equal and the MAD is 0
+MEAN_AD_SCALE = 1.253314
+# A step longer than this many intervals is a gap
+GAP_FACTOR = 1.5
+# Sampling interval assumed when a series is too short to tell
+DEFAULT_INTERVAL = 15 * 60
+
+
+def label_counts(codes: np.ndarray, codebook) -> dict:
+    counts = np.bincount(codes, minlength=len(codebook.labels)) if len(codes) else np.zeros(0, dtype=np.int64)
+    return {f"{codebook.labels[code]}": int(count) for code, count in enumerate(counts) if count}
+
+
+def analyze(series: MeasurementSeries, interval: int = None, start_ts: int = None, end_ts: int = None) -> dict:
+    """
+    Gaps against the expected interval, samples per status and origin and outliers of one channel
+    :param series: MeasurementSeries sorted by timestamp, a timestamp marks the start of its interval
+    :param interval: Seconds between samples, the median step of the series when not given
+    :param start_ts: Start of the covered period, samples missing at the start count as a gap
+    :param end_ts: End of the covered period (exclusive), samples missing at the end count as a gap
+    :return: {"samples", "interval", "gaps", "missing", "longest_gap", "nan", "outliers", "max_z",
+              "status": {label: count}, "origin": {label: count}}
+    """
+    timestamps, values = series.timestamps, series.values
+    steps = np.diff(timestamps)
+    if interval is None:
+        positive = steps[steps > 0]
+        interval = int(np.median(positive)) if len(positive) else DEFAULT_INTERVAL
+    interval = max(1, interval)
+    if start_ts is not None or end_ts is not None:
+        # The period bounds act as samples just before the first and just after the last expected one
+        edges = [[start_ts - interval]] if start_ts is not None else list()
+        edges += [timestamps] + ([[end_ts]] if end_ts is not None else list())
+        steps = np.diff(np.concatenate([np.asarray(edge, dtype=np.int64) for edge in edges]))
+    long_steps = steps[steps > interval * GAP_FACTOR]
+
+    finite = values[np.isfinite(values)]
+    outliers, max_z = 0, 0.0
+    if len(finite):
+        median = np.median(finite)
+        mad = np.median(np.abs(finite - median))
+        if mad > 0:
+            z = 0.6745 * np.abs(finite - median) / mad
+        else:
+            # e.g. PV production with more night than day samples, the MAD is 0 then
+            mean_ad = np.mean(np.abs(finite - median))
+            z = np.abs(finite - median) / (MEAN_AD_SCALE * mean_ad) if mean_ad > 0 else None
+        if z is not None:
+            outliers, max_z = int((z > OUTLIER_Z).sum()), float(z.max())
+
+    return {
+        "samples": int(len(timestamps)),
+        "interval": int(interval),
+        "gaps": int(len(long_steps)),
+        "missing": int((np.round(long_steps / interval) - 1).clip(min=0).sum()),
+        "longest_gap": int(long_steps.max()) if len(long_steps) else 0,
+        "nan": int(len(values) - len(finite)),
+        "outliers": outliers,
+        "max_z": round(max_z, 2),
+        "status": label_counts(series.status, STATUSES),
+        "origin": label_counts(series.origin, ORIGINS),
+    }
+
+
+def quality_frame(points: list, channels: list = None, start_ts: int = None, end_ts: int = None,
+                  catalog=None) -> pd.DataFrame:
+    """
+    Compact quality summary, one row per metering point and channel. The reports are computed from the stored
+    series of the shown period on every call and are not persisted themselves: a stored report would only match
+    the period it was saved for, while the pages show days, ranges and months cut from the same data.
+    :param points: Metering points with "stats" {channel: MeasurementSeries}
+    :param channels: Channels to include, all when not given
+    :param catalog: AccountCatalog, channels the meter does not have are left out (their empty placeholders
+                    would count as one gap over the whole period)
+    :param start_ts: Start of the shown period, see analyze
+    :param end_ts: End of the shown period, see analyze
+    :return: Dataframe with the analyze() counters, statuses and origins as "status:<label>"/"origin:<label>"
+    """
+    with stage("quality"):
+        rows = list()
+        for point in points:
+            for channel, series in point["stats"].items():
+                if not isinstance(series, MeasurementSeries) or (channels and channel not in channels):
+                    continue
+                if catalog is not None and catalog.get_channel_details(point["meteringPointId"], channel) is None:
+                    continue
+                report = analyze(series, start_ts=start_ts, end_ts=end_ts)
+                row = {"meteringPointId": point["meteringPointId"], "channel": channel}
+                row.update({k: v for k, v in report.items() if k not in ("status", "origin")})
+                row["longest_gap"] = round(report["longest_gap"] / 3600, 2)  # in hours
+                row.update({f"status:{k}": v for k, v in report["status"].items()})
+                row.update({f"origin:{k}": v for k, v in report["origin"].items()})
+                rows.append(row)
+        frame = pd.DataFrame(rows)
+        if len(frame):
+            counted = [c for c in frame.columns if c.startswith(("status:", "origin:"))]
+            frame[counted] = frame[counted].fillna(0).astype(np.int64)
+            frame = frame.set_index(["meteringPointId", "channel"])
+        return frame
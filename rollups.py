@@ -0,0 +1,176 @@
+import numpy as np
+import pandas as pd
+
+from series import TIMEZONE
+
+# Levels kept by the store, hourly buckets are the base the coarser ones are built from
+LEVELS = ("hour", "day", "month")
+# Sampling interval assumed when a series is too short to tell
+DEFAULT_INTERVAL = 15 * 60
+
+
+def local_starts(buckets: np.ndarray, level: str, tz: str = TIMEZONE) -> np.ndarray:
+    """
+    Unix timestamp of the local day or month start every bucket falls into
+    :param buckets: Unix timestamps
+    :param level: "day" or "month"
+    :param tz: Timezone of the calendar
+    :return: np.ndarray of int64
+    """
+    local = pd.to_datetime(buckets, unit="s", utc=True).tz_convert(tz).tz_localize(None).normalize()
+    if level == "month":
+        local = local - pd.to_timedelta(local.day - 1, unit="D")
+    starts = local.tz_localize(tz).tz_convert("UTC").tz_localize(None)
+    return ((starts - pd.Timestamp(1970, 1, 1)) // pd.Timedelta(seconds=1)).to_numpy(dtype=np.int64)
+
+
+class Rollup:
+    __slots__ = ("level", "buckets", "sum", "min", "max", "count", "missing")
+
+    def __init__(self, level: str, buckets, sums, minimums, maximums, counts, missing):
+        """
+        Aggregates of one channel per time bucket, columnar like MeasurementSeries
+        :param level: "hour", "day" or "month"
+        :param buckets: Unix timestamps of the bucket starts, sorted
+        :param sums: Sum of the values
+        :param minimums: Smallest value, NaN for buckets without samples
+        :param maximums: Largest value, NaN for buckets without samples
+        :param counts: Number of samples
+        :param missing: Number of expected samples which were not delivered
+        """
+        self.level = level
+        self.buckets = np.asarray(buckets, dtype=np.int64)
+        self.sum = np.asarray(sums, dtype=np.float64)
+        self.min = np.asarray(minimums, dtype=np.float64)
+        self.max = np.asarray(maximums, dtype=np.float64)
+        self.count = np.asarray(counts, dtype=np.int64)
+        self.missing = np.asarray(missing, dtype=np.int64)
+
+    @classmethod
+    def empty(cls, level: str = "hour"):
+        return cls(level, [], [], [], [], [], [])
+
+    @classmethod
+    def from_series(cls, series, interval: int = None):
+        """
+        Hourly buckets of the series. Hours without samples between the first and the last sample are kept
+        with their expected samples counted as missing. Hours are cut in UTC, which matches local hours for
+        timezones with whole hour offsets.
+        :param series: MeasurementSeries
+        :param interval: Seconds between samples, detected from the series when not given
+        :return: Rollup
+        """
+        valid = ~np.isnan(series.values)
+        timestamps, values = series.timestamps[valid], series.values[valid]
+        if not len(timestamps):
+            return cls.empty()
+        if interval is None:
+            steps = np.diff(timestamps)
+            steps = steps[steps > 0]
+            interval = int(np.median(steps)) if len(steps) else DEFAULT_INTERVAL
+        hours = timestamps - timestamps % 3600
+        starts = np.flatnonzero(np.append(True, hours[1:] != hours[:-1]))
+        present = hours[starts]
+
+        grid = np.arange(present[0], present[-1] + 3600, 3600, dtype=np.int64)
+        positions = np.searchsorted(grid, present)
+        sums, counts = np.zeros(len(grid)), np.zeros(len(grid), dtype=np.int64)
+        minimums, maximums = np.full(len(grid), np.nan), np.full(len(grid), np.nan)
+        sums[positions] = np.add.reduceat(values, starts)
+        minimums[positions] = np.minimum.reduceat(values, starts)
+        maximums[positions] = np.maximum.reduceat(values, starts)
+        counts[positions] = np.diff(np.append(starts, len(values)))
+        missing = np.clip(max(1, 3600 // max(1, interval)) - counts, 0, None)
+        return cls("hour", grid, sums, minimums, maximums, counts, missing)
+
+    def __len__(self):
+        return len(self.buckets)
+
+    def regroup(self, level: str, tz: str = TIMEZONE):
+        """
+        Re-aggregate into coarser local calendar buckets
+        :param level: "day" or "month"
+        :param tz: Timezone of the calendar
+        :return: Rollup
+        """
+        if not len(self.buckets):
+            return Rollup.empty(level)
+        keys = local_starts(self.buckets, level, tz)
+        starts = np.flatnonzero(np.append(True, keys[1:] != keys[:-1]))
+        return Rollup(level, keys[starts], np.add.reduceat(self.sum, starts),
+                      np.fmin.reduceat(self.min, starts), np.fmax.reduceat(self.max, starts),
+                      np.add.reduceat(self.count, starts), np.add.reduceat(self.missing, starts))
+
+    def between(self, start_ts: int, end_ts: int):
+        """
+        Buckets with start_ts <= bucket < end_ts
+        :return: Rollup
+        """
+        mask = (self.buckets >= start_ts) & (self.buckets < end_ts)
+        return Rollup(self.level, self.buckets[mask], self.sum[mask], self.min[mask], self.max[mask],
+                      self.count[mask], self.missing[mask])
+
+    def total(self) -> float:
+        return float(self.sum.sum())
+
+    def rows(self) -> list:
+        """
+        Tuples of (bucket, sum, min, max, count, missing) for storing
+        :return: list
+        """
+        minimums = [None if np.isnan(v) else v for v in self.min.tolist()]
+        maximums = [None if np.isnan(v) else v for v in self.max.tolist()]
+        return list(zip(self.buckets.tolist(), self.sum.tolist(), minimums, maximums, self.count.tolist(),
+                        self.missing.tolist()))
+
+    @classmethod
+    def from_rows(cls, level: str, rows: list):
+        """
+        Build from (bucket, sum, min, max, count, missing) tuples sorted by bucket
+        :param level: Level of the rows
+        :param rows: list of tuples
+        :return: Rollup
+        """
+        if not rows:
+            return cls.empty(level)
+        columns = list(zip(*rows))
+        minimums = [np.nan if v is None else v for v in columns[2]]
+        maximums = [np.nan if v is None else v for v in columns[3]]
+        return cls(level, columns[0], columns[1], minimums, maximums, columns[4], columns[5])
+
+    def to_frame(self, tz: str = TIMEZONE) -> pd.DataFrame:
+        """
+        Dataframe indexed by the naive local bucket start
+        :param tz: Timezone of the index
+        :return: pd.DataFrame with sum, mean, min, max, count and missing columns
+        """
+        index = pd.to_datetime(self.buckets, unit="s", utc=True).tz_convert(tz).tz_localize(None)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(self.count > 0, self.sum / self.count, np.nan)
+        return pd.DataFrame({"sum": self.sum, "mean": mean, "min": self.min, "max": self.max, "count": self.count,
+                             "missing": self.missing}, index=pd.DatetimeIndex(index, name=self.level))
+
+
+def channel_rollup(series, level: str = "day", store=None, connection_id=None, metering_point_id=None,
+                   channel: str = None) -> Rollup:
+    """
+    Rollup of the series, read from the store when it already holds every sample of the series
+    :param series: MeasurementSeries the rollup has to describe
+    :param level: "hour", "day" or "month"
+    :param store: MeasurementStore or None
+    :param connection_id: Id of the connection
+    :param metering_point_id: Id of the metering point
+    :param channel: Channel of the series
+    :return: Rollup
+    """
+    if not len(series):
+        return Rollup.empty(level)
+    start_ts, end_ts = int(series.timestamps[0]), int(series.timestamps[-1]) + 1
+    if store is not None:
+        first = start_ts - start_ts % 3600 if level == "hour" else int(local_starts(np.array([start_ts]), level)[0])
+        stored = store.rollup(connection_id, metering_point_id, channel, level, first, end_ts)
+        # Stored buckets reaching outside the series or missing some of its samples do not describe it
+        if int(stored.count.sum()) == int((~np.isnan(series.values)).sum()):
+            return stored
+    hourly = Rollup.from_series(series)
+    return hourly if level == "hour" else hourly.regroup(level)
@@ -0,0 +1,232 @@
+import json
+import os
+import struct
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Timezone of the metering points, unix timestamps from the API are converted into it
+TIMEZONE = os.environ.get("PANNEL_TIMEZONE", "Europe/Amsterdam")
+
+
+class Codebook:
+    def __init__(self):
+        """
+        Append only mapping of the repeated origin/status strings to small integer codes
+        """
+        self.lock = threading.Lock()
+        self.labels = list()
+        self.codes = dict()
+
+    def encode(self, values) -> np.ndarray:
+        """
+        Turn labels into codes, unseen labels are appended to the codebook
+        :param values: Iterable of labels
+        :return: uint8 array of codes
+        """
+        codes = self.codes
+        try:
+            return np.fromiter((codes[v] for v in values), dtype=np.uint8)
+        except KeyError:
+            pass
+        values = list(values)
+        with self.lock:
+            for value in values:
+                if value not in self.codes:
+                    if len(self.labels) > np.iinfo(np.uint8).max:
+                        raise ValueError("Too many distinct origin/status labels")
+                    self.codes[value] = len(self.labels)
+                    self.labels.append(value)
+        return np.fromiter((self.codes[v] for v in values), dtype=np.uint8, count=len(values))
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        return np.array(self.labels, dtype=object)[codes] if len(codes) else np.array(list(), dtype=object)
+
+    def remap(self, labels: list) -> np.ndarray:
+        """
+        Translation table from codes of another codebook (e.g. stored on disk) to this one
+        :param labels: Labels of the other codebook in code order
+        :return: uint8 lookup array
+        """
+        return self.encode(labels) if labels else np.zeros(0, dtype=np.uint8)
+
+
+ORIGINS = Codebook()
+STATUSES = Codebook()
+
+
+class MeasurementSeries:
+    __slots__ = ("timestamps", "values", "origin", "status")
+
+    def __init__(self, timestamps: np.ndarray, values: np.ndarray, origin: np.ndarray, status: np.ndarray):
+        """
+        Samples of one channel kept as parallel arrays
+        :param timestamps: int64 unix timestamps
+        :param values: float64 measured values, NaN when missing
+        :param origin: uint8 codes of ORIGINS
+        :param status: uint8 codes of STATUSES
+        """
+        self.timestamps = timestamps
+        self.values = values
+        self.origin = origin
+        self.status = status
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64),
+                   np.zeros(0, dtype=np.uint8), np.zeros(0, dtype=np.uint8))
+
+    @classmethod
+    def from_records(cls, samples: list):
+        """
+        Decode list of {"timestamp", "value", "origin", "status"} dictionaries as sent by the API
+        :param samples: list of dictionaries
+        :return: MeasurementSeries
+        """
+        count = len(samples)
+        timestamps = np.fromiter((s["timestamp"] for s in samples), dtype=np.int64, count=count)
+        values = np.array([s["value"] for s in samples], dtype=np.float64)
+        origin = ORIGINS.encode([s.get("origin") for s in samples])
+        status = STATUSES.encode([s.get("status") for s in samples])
+        return cls(timestamps, values, origin, status)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def nbytes(self) -> int:
+        return self.timestamps.nbytes + self.values.nbytes + self.origin.nbytes + self.status.nbytes
+
+    def last_timestamp(self):
+        return int(self.timestamps.max()) if len(self) else None
+
+    def take(self, selection):
+        """
+        New series with only the selected samples
+        :param selection: Boolean mask or positions
+        :return: MeasurementSeries
+        """
+        return MeasurementSeries(self.timestamps[selection], self.values[selection], self.origin[selection],
+                                 self.status[selection])
+
+    def between(self, start_ts: int, end_ts: int):
+        """
+        Samples with start_ts <= timestamp < end_ts
+        :return: MeasurementSeries
+        """
+        return self.take((self.timestamps >= start_ts) & (self.timestamps < end_ts))
+
+    def snapshots(self, tz: str = TIMEZONE) -> pd.DatetimeIndex:
+        """
+        Naive local time of every sample
+        :param tz: Timezone the timestamps are shown in
+        :return: DatetimeIndex named "snapshot"
+        """
+        local = pd.to_datetime(self.timestamps, unit="s", utc=True).tz_convert(tz).tz_localize(None)
+        return pd.DatetimeIndex(local, name="snapshot")
+
+    def to_frame(self, column_name: str, tz: str = TIMEZONE) -> pd.DataFrame:
+        """
+        Dataframe view of the values, the value array is shared and not copied
+        :param column_name: Name of the value column
+        :param tz: Timezone of the index
+        :return: pd.DataFrame
+        """
+        return pd.DataFrame(self.values.reshape(-1, 1), index=self.snapshots(tz), columns=[column_name], copy=False)
+
+    def to_records(self) -> list:
+        """
+        Back to the list of dictionaries as sent by the API
+        :return: list
+        """
+        origins = ORIGINS.decode(self.origin)
+        statuses = STATUSES.decode(self.status)
+        return [{"timestamp": int(ts), "value": None if np.isnan(value) else float(value), "origin": origin,
+                 "status": status}
+                for ts, value, origin, status in zip(self.timestamps, self.values, origins, statuses)]
+
+    def to_bytes(self) -> bytes:
+        """
+        Compact binary form used by the measurement store
+        :return: bytes
+        """
+        header = json.dumps({"count": len(self), "origins": list(ORIGINS.labels),
+                             "statuses": list(STATUSES.labels)}).encode()
+        return b"".join((struct.pack("<I", len(header)), header,
+                         self.timestamps.astype("<i8", copy=False).tobytes(),
+                         self.values.astype("<f8", copy=False).tobytes(),
+                         self.origin.tobytes(), self.status.tobytes()))
+
+    @classmethod
+    def from_bytes(cls, payload: bytes):
+        size, = struct.unpack_from("<I", payload)
+        header = json.loads(payload[4:4 + size])
+        count = header["count"]
+        offset = 4 + size
+        timestamps = np.frombuffer(payload, dtype="<i8", count=count, offset=offset).astype(np.int64)
+        offset += 8 * count
+        values = np.frombuffer(payload, dtype="<f8", count=count, offset=offset).astype(np.float64)
+        offset += 8 * count
+        origin = np.frombuffer(payload, dtype=np.uint8, count=count, offset=offset)
+        status = np.frombuffer(payload, dtype=np.uint8, count=count, offset=offset + count)
+        origin = ORIGINS.remap(header["origins"])[origin] if count else origin.copy()
+        status = STATUSES.remap(header["statuses"])[status] if count else status.copy()
+        return cls(timestamps, values, origin, status)
+
+    @classmethod
+    def concat(cls, parts: list):
+        """
+        Join series and keep one sample per timestamp, later parts win
+        :param parts: list of MeasurementSeries
+        :return: MeasurementSeries sorted by timestamp
+        """
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty()
+        joined = cls(np.concatenate([p.timestamps for p in parts]), np.concatenate([p.values for p in parts]),
+                     np.concatenate([p.origin for p in parts]), np.concatenate([p.status for p in parts]))
+        order = np.argsort(joined.timestamps, kind="stable")
+        ordered = joined.timestamps[order]
+        keep = np.append(ordered[1:] != ordered[:-1], True)
+        return joined.take(order[keep])
+
+
+def decode_measurements(response: dict, channels=None) -> dict:
+    """
+    Decode measurements API response into series per channel. Sample lists are released from the
+    response as soon as their channel is decoded, so only one channel exists twice at a time.
+    :param response: {channel: [samples]}, emptied by the call
+    :param channels: Channels to decode, sample lists of the other channels are dropped undecoded
+    :return: {channel: MeasurementSeries}, entries which are not sample lists are kept as they are
+    """
+    decoded = dict()
+    for channel in list(response):
+        samples = response.pop(channel)
+        if not isinstance(samples, list):
+            decoded[channel] = samples
+        elif channels is None or channel in channels:
+            decoded[channel] = MeasurementSeries.from_records(samples)
+    return decoded
+
+
+def day_bounds(day, tz: str = TIMEZONE) -> tuple:
+    """
+    Unix timestamps of the local day start and the next day start
+    :param day: date
+    :param tz: Timezone of the day
+    :return: (start, end)
+    """
+    start = pd.Timestamp(day.year, day.month, day.day).tz_localize(tz)
+    end = (pd.Timestamp(day.year, day.month, day.day) + pd.Timedelta(days=1)).tz_localize(tz)
+    return start.value // 10 ** 9, end.value // 10 ** 9
+
+
+def local_date(timestamp: int, tz: str = TIMEZONE):
+    """
+    Local calendar day of the unix timestamp
+    :param timestamp: unix timestamp
+    :param tz: Timezone of the day
+    :return: date
+    """
+    return pd.Timestamp(timestamp, unit="s", tz="UTC").tz_convert(tz).date()
@@ -0,0 +1,93 @@
+import hashlib
+import secrets
+import threading
+
+# Random per process salt so the stored hashes can not be matched against known passwords
+_SALT = secrets.token_bytes(16)
+
+
+def credential_hash(*parts: str) -> str:
+    """
+    Salted hash used instead of the credentials themselves
+    :param parts: Values to hash
+    :return: Hex digest
+    """
+    digest = hashlib.sha256(_SALT)
+    for part in parts:
+        digest.update(b"\0" + f"{part}".encode())
+    return digest.hexdigest()
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        """
+        Coalesces identical calls running at the same time into one, the callers share its result
+        """
+        self.lock = threading.Lock()
+        self.calls = dict()
+        self.counters = {"calls": 0, "deduplicated": 0}
+
+    def do(self, key, function, *args):
+        """
+        Run function unless a call with the same key is in flight, then wait for that one instead
+        :param key: Hashable identity of the call, has to include the credential scope
+        :param function: Callable doing the work
+        :param args: Arguments of the function
+        :return: Result of the function, exceptions are raised in every waiting caller
+        """
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+                self.counters["calls"] += 1
+            else:
+                self.counters["deduplicated"] += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = function(*args)
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def report(self) -> dict:
+        with self.lock:
+            report = dict(self.counters)
+            report["in_flight"] = len(self.calls)
+        total = report["calls"] + report["deduplicated"]
+        report["dedupe_ratio"] = report["deduplicated"] / total if total else 0.0
+        return report
+
+
+_default_flight = None
+_default_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """
+    Process wide single flight group shared by every session
+    :return: SingleFlight
+    """
+    global _default_flight
+    with _default_lock:
+        if _default_flight is None:
+            _default_flight = SingleFlight()
+        return _default_flight
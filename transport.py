@@ -0,0 +1,171 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import observe_route
+
+# Status codes which are worth another attempt before giving up
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Token bucket shared by every thread using the transport
+        :param rate: Allowed requests per second, 0 disables the limiter
+        :param burst: Number of requests allowed to go out at once
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available
+        :return: None
+        """
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class TransportStats:
+    def __init__(self):
+        """
+        Per route latency and error counters
+        """
+        self.lock = threading.Lock()
+        self.routes = dict()
+
+    def record(self, route: str, latency: float, error: bool = False, retried: bool = False):
+        with self.lock:
+            entry = self.routes.setdefault(route, {"calls": 0, "errors": 0, "retries": 0,
+                                                   "latency_total": 0.0, "latency_max": 0.0})
+            entry["calls"] += 1
+            entry["latency_total"] += latency
+            entry["latency_max"] = max(entry["latency_max"], latency)
+            if error:
+                entry["errors"] += 1
+            if retried:
+                entry["retries"] += 1
+
+    def snapshot(self) -> dict:
+        """
+        Copy of the counters with average latency per route
+        :return: {route: {"calls", "errors", "retries", "latency_avg", "latency_max"}}
+        """
+        with self.lock:
+            report = dict()
+            for route, entry in self.routes.items():
+                report[route] = {
+                    "calls": entry["calls"],
+                    "errors": entry["errors"],
+                    "retries": entry["retries"],
+                    "latency_avg": entry["latency_total"] / entry["calls"] if entry["calls"] else 0.0,
+                    "latency_max": entry["latency_max"]
+                }
+            return report
+
+    def reset(self):
+        with self.lock:
+            self.routes.clear()
+
+
+class Transport:
+    def __init__(self, pool_size: int = 10, connect_timeout: float = 5, read_timeout: float = 30,
+                 retries: int = 3, backoff: float = 0.5, max_backoff: float = 10, rate: float = 20,
+                 burst: int = 10):
+        """
+        Keep-alive HTTP session shared between all the API calls
+        :param pool_size: Number of pooled connections kept open per host
+        :param connect_timeout: Seconds to wait for the connection
+        :param read_timeout: Seconds to wait for the response
+        :param retries: Extra attempts on connection errors and 5xx responses
+        :param backoff: Base delay for exponential backoff in seconds
+        :param max_backoff: Upper bound for a single backoff delay
+        :param rate: Requests per second allowed towards the API, 0 disables limiting
+        :param burst: Requests allowed to go out at once before limiting kicks in
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limiter = RateLimiter(rate=rate, burst=burst)
+        self.stats = TransportStats()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def sleep_before_retry(self, attempt: int):
+        """
+        Full jitter backoff so parallel callers do not retry in lockstep
+        :param attempt: Number of the failed attempt starting with 0
+        :return: None
+        """
+        delay = min(self.max_backoff, self.backoff * (2 ** attempt))
+        time.sleep(random.uniform(0, delay))
+
+    def post(self, url: str, route: str = None, **kwargs) -> requests.Response:
+        """
+        Send POST request through the pooled session
+        :param url: Full url of the endpoint
+        :param route: Label used for the counters, defaults to the url
+        :param kwargs: Passed on to requests (auth, data, ...)
+        :return: Response of the last attempt
+        """
+        route = route or url
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            started = time.perf_counter()
+            try:
+                r = self.session.post(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                latency = time.perf_counter() - started
+                self.stats.record(route, latency, error=True, retried=attempt > 0)
+                observe_route(route, latency, "error")
+                if attempt >= self.retries:
+                    raise
+            else:
+                latency = time.perf_counter() - started
+                self.stats.record(route, latency, error=r.status_code >= 400, retried=attempt > 0)
+                observe_route(route, latency, f"{r.status_code}")
+                if r.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    return r
+            self.sleep_before_retry(attempt)
+            attempt += 1
+
+    def close(self):
+        self.session.close()
+
+
+_default_transport = None
+_default_lock = threading.Lock()
+
+
+def get_transport() -> Transport:
+    """
+    Process wide transport so every SolarCheck instance shares the same connection pool
+    :return: Transport
+    """
+    global _default_transport
+    with _default_lock:
+        if _default_transport is None:
+            _default_transport = Transport()
+        return _default_transport
@@ -0,0 +1,164 @@
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import requests
+
+from fetcher import fetch_all
+from instrumentation import stage
+from planner import plan_range, request_call, stitch
+from rollups import channel_rollup
+from series import TIMEZONE, MeasurementSeries, day_bounds
+
+# Oldest year probed for data, counted back from the current one
+MAX_YEARS_BACK = 10
+# Seconds the probed years of a connection are reused
+YEARS_TTL = 6 * 60 * 60
+# Day of the leap year each month starts at, counted from 0
+LEAP_MONTH_STARTS = np.cumsum([0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30])
+
+_years = dict()
+_years_lock = threading.Lock()
+
+
+def year_range(year: int, today: date = None) -> tuple:
+    """
+    Days of the year which can have data
+    :param year: Year
+    :param today: Reference date, defaults to today
+    :return: (first day, last day)
+    """
+    yesterday = (today or date.today()) - timedelta(days=1)
+    return date(year, 1, 1), min(date(year, 12, 31), yesterday)
+
+
+def has_data(results: list) -> bool:
+    return any(isinstance(value, MeasurementSeries) and len(value)
+               for result in results if isinstance(result, dict) for value in result.values())
+
+
+def probe_days(year: int) -> list:
+    """
+    Days probed for data in a year, the middle of every month from December back to January
+    :param year: Year
+    :return: list of dates
+    """
+    return [date(year, month, 15) for month in range(12, 0, -1)]
+
+
+def year_has_data(solar, connection_id, point_ids: list, year: int) -> bool:
+    """
+    Probe single days of the year through the daily endpoint, one metering point at a time
+    :return: True as soon as one metering point has data on one of the probed days
+    """
+    for day in probe_days(year):
+        for point_id in point_ids:
+            try:
+                result = solar.get_daily(connection_id, point_id, day.year, day.month, day.day)
+            except (requests.RequestException, ValueError):
+                continue
+            if has_data([result]):
+                return True
+    return False
+
+
+def available_years(solar, connection_id, point_ids: list, today: date = None) -> list:
+    """
+    Years with data. Earlier years are probed one at a time going back until the first one without data.
+    A year is probed on a single day per month (see probe_days) and the probing stops at the first metering point
+    with data, so a year with data usually costs one daily request and an empty year 12 per metering point.
+    Completed days are final, so the probes are served from the measurement store after the first run.
+    :param solar: SolarCheck instance
+    :param connection_id: Id of the connection
+    :param point_ids: Metering point ids probed, any of them having data makes the year available
+    :param today: Reference date, defaults to today
+    :return: Years, newest first
+    """
+    current = ((today or date.today()) - timedelta(days=1)).year
+    key = (solar.scope, connection_id, current, tuple(point_ids))
+    with _years_lock:
+        cached = _years.get(key)
+        if cached and time.monotonic() - cached[0] < YEARS_TTL:
+            return list(cached[1])
+
+    years = [current]
+    for year in range(current - 1, current - 1 - MAX_YEARS_BACK, -1):
+        if not year_has_data(solar, connection_id, point_ids, year):
+            break
+        years.append(year)
+    with _years_lock:
+        _years[key] = (time.monotonic(), years)
+    return list(years)
+
+
+def fetch_years(ids: list, solar, connection_id, years: list, max_in_flight: int = None) -> dict:
+    """
+    Fetch every month of the years for every metering point in one parallel batch
+    :param ids: Metering points as returned by SolarCheck.process_mettering_points
+    :param solar: SolarCheck instance
+    :param connection_id: Id of the connection
+    :param years: Years to fetch
+    :param max_in_flight: Maximum number of parallel API requests
+    :return: {year: [metering points with "stats"]}, points with a failed request are left out of that year
+    """
+    plans = {year: plan_range(*year_range(year)) for year in years}
+    calls = [request_call(solar, connection_id, id["meteringPointId"], request)
+             for year in years for id in ids for request in plans[year]]
+    with stage("fetch"):
+        results = fetch_all(calls, max_in_flight=max_in_flight)
+
+    fetched = dict()
+    position = 0
+    for year in years:
+        start_ts, end_ts = day_bounds(year_range(year)[0])[0], day_bounds(year_range(year)[1])[1]
+        fetched[year] = list()
+        for id in ids:
+            responses = results[position:position + len(plans[year])]
+            position += len(plans[year])
+            if all(isinstance(response, dict) for response in responses):
+                point = dict(id)
+                point["stats"] = stitch(responses, start_ts, end_ts)
+                fetched[year].append(point)
+    return fetched
+
+
+def year_overlay(fetched: dict, connection_id, level: str = "month", store=None, channels: list = None,
+                 metering_point_id=None, tz: str = TIMEZONE) -> pd.DataFrame:
+    """
+    Totals of every channel and year on a shared month or day of year axis, built from the rollups
+    :param fetched: Result of fetch_years
+    :param connection_id: Id of the connection
+    :param level: "month" for monthly totals, "day" for daily totals by day of the leap year calendar (1-366)
+    :param store: MeasurementStore holding the rollups or None
+    :param channels: Channels to include, all fetched ones when not given
+    :param metering_point_id: Only this metering point, the sum of all of them when not given
+    :param tz: Timezone of the calendar
+    :return: Dataframe with one "<channel> <year>" column per channel and year
+    """
+    with stage("year_overlay"):
+        size = 12 if level == "month" else 366
+        columns = dict()
+        for year, points in sorted(fetched.items()):
+            for point in points:
+                if metering_point_id is not None and f"{point['meteringPointId']}" != f"{metering_point_id}":
+                    continue
+                for channel, series in point["stats"].items():
+                    if not isinstance(series, MeasurementSeries) or (channels and channel not in channels):
+                        continue
+                    rollup = channel_rollup(series, level, store, connection_id, point["meteringPointId"], channel)
+                    if not len(rollup):
+                        continue
+                    local = pd.to_datetime(rollup.buckets, unit="s", utc=True).tz_convert(tz)
+                    months = local.month.to_numpy() - 1
+                    # Days sit on the leap year calendar, March 1 has the same slot in every year
+                    positions = months if level == "month" else LEAP_MONTH_STARTS[months] + local.day.to_numpy() - 1
+                    column, seen = columns.setdefault(f"{channel} {year}", (np.zeros(size), np.zeros(size, bool)))
+                    column += np.bincount(positions, weights=rollup.sum, minlength=size)
+                    seen |= np.bincount(positions, minlength=size) > 0
+
+        index = pd.RangeIndex(1, size + 1, name="month" if level == "month" else "day of year")
+        # Slots without any bucket (Feb 29 of other years, months to come) stay empty instead of zero
+        return pd.DataFrame({name: np.where(seen, column, np.nan) for name, (column, seen) in columns.items()},
+                            index=index)